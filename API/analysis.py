@@ -1,12 +1,31 @@
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
 import glob
+import gzip
+import hashlib
 import json
+import os
 import re
-from typing import cast, Dict, List, TypedDict, Union
+import sys
+from typing import Any, Dict, List, Optional, Tuple, TypedDict, Union
 
 import numpy as np
 from numpy.typing import NDArray
 import pandas as pd
 
+try:
+    import brotli
+except ImportError:  # optional: without it, only gzip variants are published
+    brotli = None
+
+from badges import update_badges
+from elo_history import ELO_FILE, ELO_INDEX_FILE, elo_artifacts
+from history import (as_frame, as_history, DERIVED_COLUMNS, History, history_frame,
+                     history_from_rounds, history_players, npz_archive, replace_rounds,
+                     result_positions, round_results, round_sizes, select_rounds)
+from match_table import (build_match_table, load_match_table, MATCH_TABLE_ARTIFACT,
+                         MATCH_TABLE_FILE, match_table_archive, update_match_table)
+
 # consume all the raw data and prepare info ready to serve for the API
 # hall of fame
 # players
@@ -18,180 +37,572 @@ import pandas as pd
 # Pro runde:
 # Regeln?, decks, Ergebnisse, Link zum thread
 
-
-class BaseBadge(TypedDict):
-    """ Basic Badge class, holding only the type of badge. This ensures that the type is always
-        given.
+# manifest of raw file hashes, derived round tables and Elo checkpoint of the last run
+CACHE_DIR = 'data/cache'
+# raw file hashes of the last successful publication (only written by main, after publishing)
+PUBLISHED_STATE = f"{CACHE_DIR}/published.json"
+# every published artifact is written to all of these (API and frontend)
+OUTPUT_ROOTS = ['data', '../frontend/src/data']
+# binary archives (head-to-head data and match table) are only published for the API
+ARCHIVE_ROOTS = ['data']
+# content hash of every artifact in an output root, written last (servers watch it for changes)
+PUBLISH_MANIFEST = 'manifest.json'
+# roots served over HTTP get precompressed siblings (e.g. x.json.gz) of the artifacts the API
+# sends as they are (see cached_json in flask_app.py), the others are only read by the server
+COMPRESSED_ROOTS = ['data']
+COMPRESSED_ARTIFACTS = ['hall_of_fame.json', 'players_rounds_lists.json', 'popular_cards.json',
+                        'players/*.json', 'rounds/*.json']
+COMPRESSED_SUFFIXES = ['.gz', '.br'] if brotli is not None else ['.gz']
+# brotli quality of the siblings: 11 takes seconds for the larger artifacts, 5 milliseconds
+BROTLI_QUALITY = 5
+
+# Elo rating system: rating of new players, update factor (K) and divisor of the rating
+# difference in the expected score (see elo_sweep.py for calibrating them)
+ELO_START = 1600.
+ELO_UPDATE_FACTOR = 8
+ELO_DIVISOR = 512
+
+
+class ResultError(TypedDict):
+    """ Inconsistency in the results table of a round. i and j are the (1-based) indices of
+        the players in the round, None if the error concerns the whole table.
     """
-    type: str
+    round: int
+    i: Optional[int]
+    j: Optional[int]
+    values: List[float]
+    reason: str
 
 
-class Badge(BaseBadge, total=False):
-    """ Actual Badge class for usage, defining all optional fields of the different badge types.
+class HeadToHead(TypedDict):
+    """ All-pairs match history. counts[p, o, r] is the number of matches in which player p
+        scored r points against opponent o; first_met[p, o] orders the opponents of p by
+        their first encounter.
     """
-    length: int
-    round: int
-    rounds: List[int]
+    player_ids: Dict[str, int]
+    counts: NDArray[np.int32]
+    first_met: NDArray[np.int64]
 
 
-def add_derivates_to_round(df: pd.DataFrame) -> None:
-    """ Add derivative columns to history DataFrame.
+def add_derivates_to_round(data: Union[pd.DataFrame, History]) -> None:
+    """ Add the derived columns ('sum', '%' and 'place') to the history. All rounds are
+        handled at once, from the flat results buffer (see history.History).
     Args:
-        df (pandas DataFrame): Full round history.
+        data (History or pandas DataFrame): Full round history (or a single round); rows of
+            a DataFrame round in the order of its 'result_*' columns.
     """
-    # to apply this to the whole of all data, use groupby 'round'?
-    df['sum'] = df.loc[:, df.columns.str.startswith('result_')].sum(axis=1)
+    history = as_history(data)
+    sizes = round_sizes(history)
+    round_numbers = np.repeat(history['rounds'], sizes)
+    size = np.repeat(sizes, sizes)
+    rows, columns = result_positions(history)
+    results = history['results']
 
-    df['%'] = df['sum'] / (len(df)-1) / 6 * 100
+    total = np.bincount(rows, weights=results, minlength=len(size)).astype(int)
 
-    # has to be done after computing '%'
-    if 'bonus' in df.columns:  # e.g. round 65
-        df['sum'] = df['sum'] + df['bonus']
+    percent = total / (size-1) / 6 * 100
 
-    if df.at[0, 'round'] in [75, 79]:  # least points win
-        ascending = True
-    else:
-        ascending = False
+    # has to be done after computing '%' (e.g. round 65)
+    total = total + history['bonus']
+
+    # least points win in rounds 75 and 79: rank -sum instead of sum otherwise
+    ascending = np.isin(round_numbers, [75, 79])
+    sign = np.where(ascending, 1, -1)
+
+    place = pd.Series(total * sign).groupby(round_numbers).rank(method='min').to_numpy(dtype=int)
 
-    df['place'] = df['sum'].rank(method='min', ascending=ascending).astype(int)
-    if df.at[0, 'round'] >= 30:  # introduction of tiebreaker rule in round 30
-        for pl in df['place'].unique():
-            indices = df.index[df['place'] == pl]
-            row_sums = df.loc[indices, [f"result_{idx}" for idx in indices]].sum(axis=1)
-            ranks = row_sums.rank(method='min', ascending=ascending).astype(int)
-            df.loc[indices, 'place'] = ranks + pl - 1
+    # introduction of tiebreaker rule in round 30: rank tied players by the sum of their
+    # results against each other (mini league)
+    opponents = np.repeat(history['offsets'][:-1], sizes)[rows] + columns
+    is_tied = place[opponents] == place[rows]
+    tie_sums = np.bincount(rows, weights=np.where(is_tied, results, 0), minlength=len(size))
+    ranks = (pd.Series(tie_sums * sign).groupby([round_numbers, place])
+             .rank(method='min').to_numpy(dtype=int))
 
+    history['sum'] = total.astype(np.int32)
+    history['percent'] = percent
+    history['place'] = np.where(round_numbers >= 30, ranks + place - 1, place).astype(np.int32)
 
-def most_played_cards(df: pd.DataFrame) -> Dict[str, List[Dict[str, Union[int, float]]]]:
+    if isinstance(data, pd.DataFrame):  # back to the rows of the DataFrame
+        order = np.argsort(data['round'].to_numpy(), kind='stable')
+        for key, column in DERIVED_COLUMNS.items():
+            values = np.empty_like(history[key])  # type: ignore
+            values[order] = history[key]  # type: ignore
+            data[column] = values
+
+
+def intern_cards(df: pd.DataFrame) -> None:
+    """ Store the 'card_*' columns as categoricals sharing one vocabulary of card names
+        (sorted), so every deck is a row of integer codes (-1 for no card).
+    Args:
+        df (pandas DataFrame): History of rounds played, with 'card_*' columns.
+    """
+    card_cols = df.columns[df.columns.str.startswith('card_')]
+    cards = pd.unique(df[card_cols].to_numpy().ravel())
+    vocabulary = pd.CategoricalDtype(sorted(cards[pd.notna(cards)]))
+    for col in card_cols:
+        df[col] = df[col].astype(vocabulary)
+
+
+def most_played_cards(data: Union[pd.DataFrame, History]
+                      ) -> Dict[str, List[Dict[str, Union[int, float]]]]:
     """ Find the most-played cards for all players and overall from a pandas
-        DataFrame.
+        DataFrame, counting the card codes (see intern_cards) of all players at once.
     Args:
-        df (pandas DataFrame): History of rounds played, with 'player' and
+        data (History or pandas DataFrame): History of rounds played, with 'player' and
             'card_*' columns.
     Return:
         Dictionary with a list of popular cards for each player and overall.
     """
+    df = as_frame(data)
+    card_cols = df.columns[df.columns.str.startswith('card_')]
+    if not all(isinstance(df[col].dtype, pd.CategoricalDtype) for col in card_cols):
+        df = df.copy()
+        intern_cards(df)
+    vocabulary = np.array(df[card_cols[0]].cat.categories, dtype=object)
+
+    codes = np.column_stack([df[col].cat.codes.to_numpy() for col in card_cols])
+    player_codes, player_names = pd.factorize(df['player'], sort=True)
+    player_codes = np.repeat(player_codes, len(card_cols))[codes.ravel() >= 0]
+    codes = codes.ravel()[codes.ravel() >= 0]
+
+    def popularity_list(cards: NDArray[np.int64],
+                        counts: NDArray[np.int64]) -> List[Dict[str, Union[int, float]]]:
+        """ List of cards with counts, most played first (then alphabetically). """
+        order = np.lexsort((cards, -counts))
+        return [{'card': c, 'count': n, '%': p} for c, n, p in zip(
+            vocabulary[cards[order]], counts[order].tolist(),
+            (counts[order] / counts.sum() * 100).tolist())]
+
+    counts = np.bincount(codes, minlength=len(vocabulary))
+    mp_cards = {'overall': popularity_list(np.flatnonzero(counts), counts[counts > 0])}
+
+    # sparse (player, card) counts, split into one block per player
+    pairs, counts = np.unique(player_codes * len(vocabulary) + codes, return_counts=True)
+    pair_players, pair_cards = np.divmod(pairs, len(vocabulary))
+    blocks = np.flatnonzero(np.diff(pair_players, prepend=-1))
+    for start, end in zip(blocks, np.append(blocks[1:], len(pairs))):
+        mp_cards[str(player_names[pair_players[start]])] = popularity_list(pair_cards[start:end],
+                                                                         counts[start:end])
+
+    return mp_cards
+
+
+def build_card_index(data: Union[pd.DataFrame, History]
+                     ) -> Dict[str, Dict[str, List[Union[int, str]]]]:
+    """ Build an inverted index from every card to the decks it was played in.
+    Args:
+        data (History or pandas DataFrame): History of rounds played, with 'round', 'player',
+            'card_*', 'sum' and 'place' columns; rows of a round in their original order.
+    Return:
+        Dictionary with the postings of every card (chronological), as lists of 'round',
+        'player', 'index' (of the deck in the round), 'points' and 'place'.
+    """
+    df = as_frame(data)
+    card_cols = df.columns[df.columns.str.startswith('card_')]
+    if not all(isinstance(df[col].dtype, pd.CategoricalDtype) for col in card_cols):
+        df = df.copy()
+        intern_cards(df)
+    vocabulary = df[card_cols[0]].cat.categories
+
+    codes = np.column_stack([df[col].cat.codes.to_numpy() for col in card_cols])
+    rows, _ = np.nonzero(codes >= 0)
+    codes = codes[codes >= 0]
+    rounds = df['round'].to_numpy()[rows]
+    deck_index = df.groupby('round', sort=False).cumcount().to_numpy()[rows] + 1
+
+    order = np.lexsort((deck_index, rounds, codes))
+    rows, codes, rounds, deck_index = rows[order], codes[order], rounds[order], deck_index[order]
+    players = df['player'].to_numpy()[rows].tolist()
+    points = df['sum'].to_numpy()[rows].tolist()
+    places = df['place'].to_numpy()[rows].tolist()
+    rounds, deck_index = rounds.tolist(), deck_index.tolist()
+
+    card_index = {}
+    blocks = np.flatnonzero(np.diff(codes, prepend=-1))
+    for start, end in zip(blocks.tolist(), np.append(blocks[1:], len(codes)).tolist()):
+        card_index[vocabulary[codes[start]]] = {'round': rounds[start:end],
+                                                'player': players[start:end],
+                                                'index': deck_index[start:end],
+                                                'points': points[start:end],
+                                                'place': places[start:end]}
+
+    return card_index
+
+
+def find_result_errors(data: Union[pd.DataFrame, History]) -> List[ResultError]:
+    """ Check the results tables of all rounds in a DataFrame at once. Every table has to be
+        square and every pair of results one of 6-0, 4-1, 2-2 or 3-3.
+    Args:
+        data (History or pd.DataFrame): One or multiple rounds, with 'round' and 'result_*'
+            columns (numbers or strings like '06').
+    Returns:
+        List[ResultError]: All inconsistencies found, sorted by round and players.
+    """
+    df = data if isinstance(data, pd.DataFrame) else history_frame(data, with_results=True)
+    # possible results: 6-0, 4-1, 3-3, ...
+    valid_results = np.zeros((7, 7), dtype=bool)
+    valid_results[[0, 6, 1, 4, 2, 3], [6, 0, 4, 1, 2, 3]] = True
 
-    unique_cards = df.loc[:, df.columns.str.startswith(
-        'card_')].stack().dropna().value_counts()
-    mp_cards = {'overall': [{'card': c, 'count': int(n), '%': n/sum(unique_cards.values)*100}
-                            for c, n in zip(unique_cards.index, unique_cards.values)]}
-    mp_cards['overall'].sort(key=lambda cc: (-cc['count'], cc['card']))
+    result_cols = sorted(df.columns[df.columns.str.startswith('result_')],
+                         key=lambda x: int(x.split('_')[1]))
+    round_indices = df.groupby('round').indices
+    round_numbers = np.array(sorted(round_indices))
+    sizes = np.array([len(round_indices[r]) for r in round_numbers])
+    offsets = np.cumsum(sizes) - sizes
 
-    for player, player_data in df.groupby('player'):
-        all_cards = player_data.loc[:,
-                                    player_data.columns.str.startswith('card_')]
+    # results of all rounds, one block of rows per round
+    rows = np.concatenate([round_indices[r] for r in round_numbers])
+    results = df[result_cols].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)[rows]
 
-        unique_cards = all_cards.stack().dropna().value_counts()
+    errors: List[ResultError] = []
 
-        mp_cards[str(player)] = [{'card': c, 'count': int(n), '%': n/sum(unique_cards.values)*100}
-                                 for c, n in zip(unique_cards.index, unique_cards.values)]
-        mp_cards[str(player)].sort(key=lambda cc: (-cc['count'], cc['card']))
+    # should be square: no results beyond the number of players in a round
+    n_cols = np.where(np.isnan(results), 0, np.arange(1, len(result_cols) + 1)).max(axis=1)
+    is_square = (np.maximum.reduceat(n_cols, offsets) <= sizes) & (sizes <= len(result_cols))
+    for r in round_numbers[~is_square]:
+        errors.append({'round': int(r), 'i': None, 'j': None, 'values': [], 'reason': 'not square'})
 
-    return mp_cards
+    # all upper-triangle pairs (i, j) of all square rounds of the same size in one go
+    for size in np.unique(sizes[is_square]):
+        i, j = np.triu_indices(size, 1)
+        blocks = np.flatnonzero(is_square & (sizes == size))
+        res_ij = results[offsets[blocks, np.newaxis] + i, j]
+        res_ji = results[offsets[blocks, np.newaxis] + j, i]
+
+        is_number = np.isfinite(res_ij) & np.isfinite(res_ji)
+        in_range = (is_number & (res_ij == np.round(res_ij)) & (res_ji == np.round(res_ji))
+                    & (res_ij >= 0) & (res_ij <= 6) & (res_ji >= 0) & (res_ji <= 6))
+        is_valid = in_range & valid_results[np.where(in_range, res_ij, 0).astype(int),
+                                            np.where(in_range, res_ji, 0).astype(int)]
+
+        for b, p in zip(*np.nonzero(~is_valid)):
+            errors.append({'round': int(round_numbers[blocks[b]]),
+                           'i': int(i[p]) + 1, 'j': int(j[p]) + 1,
+                           'values': [float(res_ij[b, p]), float(res_ji[b, p])],
+                           'reason': 'invalid result' if is_number[b, p] else 'missing result'})
+
+    errors.sort(key=lambda e: (e['round'], e['i'] or 0, e['j'] or 0))
+
+    return errors
 
 
 def validate_results(df: pd.DataFrame) -> bool:
     """Validate the results columns in a Dataframe containing one or multiple rounds.
     Args:
-        df (pd.DataFrame): _description_
+        df (pd.DataFrame): One or multiple rounds, with 'round' and 'result_*' columns.
     Returns:
         bool: Is / are the results table(s) consistent?
     """
-    # possible results: 6-0, 4-1, 3-3, ...
-    valid_results = {(0, 6), (6, 0),
-                     (1, 4), (4, 1),
-                     (2, 2), (3, 3)}
+    errors = find_result_errors(df)
 
-    is_valid = True
-    for round_number, round_data in df.groupby('round'):
-        res_table = round_data.loc[:, round_data.columns.str.startswith(
-            'result_')].to_numpy()
+    for error in errors:
+        if error['i'] is None:
+            print(f"Error in results ({error['round']}): {error['reason']}.")
+        else:
+            print(f"Error in results ({error['round']}): "
+                  f"{error['i']} {error['j']}: {error['values'][0]:g}-{error['values'][1]:g}")
 
-        if res_table.shape[0] != res_table.shape[1]:  # should be square
-            print(f"Error in results ({round_number}): not square.")
-            return False
+    return not errors
 
-        for i in range(res_table.shape[0]):
-            for j in range(i+1, res_table.shape[1]):
-                if (res_table[i, j], res_table[j, i]) not in valid_results:
-                    print(
-                        f"Error in results ({round_number}): "
-                        f"{i + 1} {j + 1}: {res_table[i, j]}-{res_table[j, i]}"
-                    )
-                    is_valid = False
 
-    return is_valid
+def file_hash(file_name: str) -> str:
+    """ Hash the content of a file, to detect changes between runs.
+    Args:
+        file_name (str): Path of the file.
+    Returns:
+        str: SHA-256 hex digest of the file content.
+    """
+    with open(file_name, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
 
 
-def load_data() -> pd.DataFrame:
-    """ Load full raw dataset from the individual csv files to a single pandas
-        DataFrame.
+def round_number_from_file(file_name: str) -> int:
+    """ Get the round number from the name of a raw data file (data/raw/round_*.csv).
+    Args:
+        file_name (str): Name or path of the file.
+    Returns:
+        int: Round number.
+    """
+    return int(re.findall(r'round_(\d+)\.csv$', file_name)[0])
+
+
+def read_round(file_name: str) -> Optional[pd.DataFrame]:
+    """ Read and validate a single round from its csv file.
+    Args:
+        file_name (str): Path of the csv file.
+    Returns:
+        Optional[pd.DataFrame]: Data of the round, None if the results are not valid.
     """
-    data_cumu = pd.DataFrame()
-    for file in glob.glob('data/raw/round_*.csv'):
-        data = pd.read_csv(file, sep=';')
+    data = pd.read_csv(file_name, sep=';')
+
+    str_cols = data.select_dtypes(include='object').columns
+    data[str_cols] = data[str_cols].apply(lambda s: s.str.strip())
 
-        str_cols = data.select_dtypes(include='object').columns
-        data[str_cols] = data[str_cols].apply(lambda s: s.str.strip())
+    if not validate_results(data):
+        return None
 
-        if validate_results(data):
-            add_derivates_to_round(data)
-            data_cumu = pd.concat([data_cumu, data])
+    return data
 
-    return data_cumu
+
+def load_rounds(use_cache: bool = True) -> Tuple[History, Dict[str, str]]:
+    """ Load the full raw dataset to a compact history (see history.History), parsing only
+        the csv files that changed since they were last parsed (in parallel). The content hash
+        of every file is kept in a manifest, the table of every round and a snapshot of the
+        full history as pickles in CACHE_DIR. If no file changed, only the snapshot is read;
+        otherwise the changed rounds are replaced in the snapshot (see history.replace_rounds)
+        and the round tables are only read if there is no snapshot.
+        This is only a parse cache: which rounds have to be published again is decided by
+        comparing the returned hashes with the published state (see changed_rounds).
+    Args:
+        use_cache (bool): Reuse the cached tables of unchanged files, otherwise parse all.
+    Returns:
+        Tuple[History, Dict[str, str]]: Full round history and the content hash of every raw
+            file, by file name.
+    """
+    os.makedirs(f"{CACHE_DIR}/rounds", exist_ok=True)
+    manifest_file = f"{CACHE_DIR}/manifest.json"
+    snapshot_file = f"{CACHE_DIR}/history.pkl"
+
+    manifest: Dict[str, Dict[str, Union[str, bool]]] = {}
+    snapshot: Optional[History] = None
+    if use_cache and os.path.exists(manifest_file):
+        with open(manifest_file, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+        if os.path.exists(snapshot_file):
+            snapshot = pd.read_pickle(snapshot_file)
+            if not isinstance(snapshot, dict):  # a DataFrame of an older version
+                snapshot = None
+
+    files = sorted(glob.glob('data/raw/round_*.csv'), key=round_number_from_file)
+    hashes = {os.path.basename(file): file_hash(file) for file in files}
+
+    if snapshot is not None and hashes == {name: entry['hash']
+                                           for name, entry in manifest.items()}:
+        return snapshot, hashes
+
+    new_manifest: Dict[str, Dict[str, Union[str, bool]]] = {}
+    round_dfs: Dict[str, pd.DataFrame] = {}
+    files_to_parse = []
+    for file in files:
+        name = os.path.basename(file)
+        cache_file = f"{CACHE_DIR}/rounds/{name[:-4]}.pkl"
+
+        if manifest.get(name, {}).get('hash') == hashes[name]:
+            if not manifest[name]['valid'] or snapshot is not None:  # nothing to read
+                new_manifest[name] = manifest[name]
+                continue
+            if os.path.exists(cache_file):
+                new_manifest[name] = manifest[name]
+                round_dfs[name] = pd.read_pickle(cache_file)
+                continue
+
+        files_to_parse.append(file)
+
+    if len(files_to_parse) > 1:
+        with ProcessPoolExecutor() as executor:
+            parsed_rounds = list(executor.map(read_round, files_to_parse))
+    else:
+        parsed_rounds = [read_round(file) for file in files_to_parse]
+
+    parsed_dfs: Dict[str, pd.DataFrame] = {}
+    for file, data in zip(files_to_parse, parsed_rounds):
+        name = os.path.basename(file)
+        cache_file = f"{CACHE_DIR}/rounds/{name[:-4]}.pkl"
+        new_manifest[name] = {'hash': hashes[name], 'valid': data is not None}
+
+        if data is None:
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+        else:
+            data.to_pickle(cache_file)
+            parsed_dfs[name] = data
+
+    removed_files = set(manifest) - set(new_manifest)
+    for name in removed_files:  # raw file was removed
+        if os.path.exists(f"{CACHE_DIR}/rounds/{name[:-4]}.pkl"):
+            os.remove(f"{CACHE_DIR}/rounds/{name[:-4]}.pkl")
+
+    if snapshot is not None:
+        # only the changed rounds are built, then swapped into the snapshot
+        new_rounds = history_from_rounds(list(parsed_dfs.values()))
+        add_derivates_to_round(new_rounds)
+        removed = [round_number_from_file(name)
+                   for name in [*removed_files, *(os.path.basename(f) for f in files_to_parse)]]
+        history = replace_rounds(snapshot, new_rounds, removed)
+    else:
+        # build the compact history once, from all rounds
+        history = history_from_rounds([*round_dfs.values(), *parsed_dfs.values()])
+        add_derivates_to_round(history)
+
+    pd.to_pickle(history, snapshot_file)
+    with open(manifest_file, 'w', encoding='utf-8') as file:
+        json.dump(new_manifest, file, ensure_ascii=False, indent=4)
+
+    return history, hashes
+
+
+def load_published_state() -> Dict[str, str]:
+    """ Raw file hashes of the last successful publication (empty if there was none). """
+    if not os.path.exists(PUBLISHED_STATE):
+        return {}
+    with open(PUBLISHED_STATE, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_published_state(hashes: Dict[str, str]) -> None:
+    """ Record the raw file hashes that are now published (atomically, only after
+        publish_artifacts succeeded, so that a failed run is repeated in full by the next one).
+    Args:
+        hashes (Dict[str, str]): Content hash of every raw file, by file name (see
+            load_rounds).
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(f"{PUBLISHED_STATE}.tmp", 'w', encoding='utf-8') as file:
+        json.dump(hashes, file, ensure_ascii=False, indent=4)
+    os.replace(f"{PUBLISHED_STATE}.tmp", PUBLISHED_STATE)
+
+
+def changed_rounds(published: Dict[str, str], hashes: Dict[str, str]) -> List[int]:
+    """ Rounds whose raw files were added, modified or removed since the last publication.
+    Args:
+        published (Dict[str, str]): Raw file hashes of the last publication (see
+            load_published_state).
+        hashes (Dict[str, str]): Current raw file hashes (see load_rounds).
+    Returns:
+        List[int]: Sorted round numbers.
+    """
+    names = {name for name in set(published) | set(hashes)
+             if published.get(name) != hashes.get(name)}
+    return sorted(round_number_from_file(name) for name in names)
 
 
-def find_nemesis(df: pd.DataFrame, player: str, n: int = 5) -> List[Dict[str, Union[str, float, int]]]:
+def load_data() -> pd.DataFrame:
+    """ Load full raw dataset from the individual csv files to a single pandas
+        DataFrame, one row per player and round, with the 'result_*' columns as in the
+        raw data (see history.history_frame).
     """
+    return history_frame(load_rounds()[0], with_results=True)
+
+
+def compute_head_to_head(data: Union[pd.DataFrame, History]) -> HeadToHead:
+    """ Count the results of all pairings of players over the full history in a single pass.
     Args:
-        df (pandas DataFrame): Full match history; 'round', 'player' and
+        data (History or pandas DataFrame): Full match history; 'round', 'player' and
             'result_*' columns.
+    Return:
+        HeadToHead with the result counts of every pair of players.
+    """
+    history = as_history(data)
+    player_ids: Dict[str, int] = {}
+    for player in history_players(history):
+        player_ids[str(player)] = len(player_ids)
+
+    counts = np.zeros((len(player_ids), len(player_ids), 7), dtype=np.int32)
+    first_met = np.full((len(player_ids), len(player_ids)), np.iinfo(np.int64).max)
+
+    code_ids = np.array([player_ids.get(str(player), -1) for player in history['players']],
+                        dtype=int)
+    ids_all = code_ids[history['player_codes']]
+    max_size = round_sizes(history).max(initial=0) + 1
+
+    for i in range(len(history['rounds'])):
+        ids = ids_all[history['offsets'][i]:history['offsets'][i + 1]]
+        results = round_results(history, i)
+
+        # a player listed twice in a round (round 107) only counts with their first row
+        _, first_index = np.unique(ids, return_index=True)
+        players = ids[first_index, np.newaxis]
+        np.add.at(counts, (players, ids[np.newaxis, :], results[first_index]), 1)
+        np.minimum.at(first_met, (players, ids[np.newaxis, :]),
+                      i * max_size + np.arange(len(ids))[np.newaxis, :])
+
+    return {'player_ids': player_ids, 'counts': counts, 'first_met': first_met}
+
+
+def rank_opponents(h2h: HeadToHead, player: str, n: int = 5,
+                   ascending: bool = True) -> List[Dict[str, Union[str, float, int]]]:
+    """ Rank the opponents of a player by the aggregate score of their matches.
+    Args:
+        h2h (HeadToHead): Result counts of all pairings (see compute_head_to_head).
         player (string): Name of the player.
         n (int): Number of opponents to be returned.
+        ascending (bool): Worst score first (nemesis) or best score first (victims).
     Return:
         Sorted list of opponents, each as a dictionary with name of the opponent,
         aggregate score and number of matches played.
     """
-    data_dict: Dict[str, NDArray[np.float_]] = {}
-    for round_data in df.groupby('round', group_keys=False):
-        player_names = round_data[1]['player'].to_list()
-        results = round_data[1].dropna(axis=1)
-        results = results.loc[results['player'] == player]
-        try:  # not everyone in every round
-            results_array = results.loc[:, results.columns.str.startswith('result_')].to_numpy()[
-                0, :]
-            for p, r in zip(player_names, results_array):
-                try:
-                    data_dict[p][int(r)] += 1
-                except:
-                    data_dict[p] = np.zeros(7, dtype=float)
-                    data_dict[p][int(r)] += 1
-        except:
-            pass
-
-    del data_dict[player]  # remove the target player
-
-    for p in data_dict:  # [score, times played]
-        data_dict[p] = np.array([np.dot(data_dict[p], [-6, -3, 0, 0, 3, 0, 6]) /
-                                 np.sum(data_dict[p]), np.sum(data_dict[p])])  # [-2,-1,0,0,1,0,2]
-
-    data = [{'player': p, 'score': snm[0], 'n_matches': int(
-        snm[1])} for p, snm in data_dict.items()]
-    data.sort(key=lambda d: (d['score'], -d['n_matches']))
-
-    return data[:n]
-
-
-def get_scores(df: pd.DataFrame) -> Dict[str, Dict[str, Union[float, List[Dict[int, float]]]]]:
+    player_names = list(h2h['player_ids'])
+    index = h2h['player_ids'][player]
+    counts = h2h['counts'][index]
+
+    n_matches = counts.sum(axis=1)
+    opponents = np.flatnonzero(n_matches)
+    opponents = opponents[opponents != index]  # remove the target player
+
+    # [-2,-1,0,0,1,0,2]
+    score = counts[opponents] @ np.array([-6, -3, 0, 0, 3, 0, 6]) / n_matches[opponents]
+    order = np.lexsort((h2h['first_met'][index, opponents], -n_matches[opponents],
+                        score if ascending else -score))
+
+    return [{'player': player_names[opponents[o]], 'score': float(score[o]),
+             'n_matches': int(n_matches[opponents[o]])} for o in order[:n]]
+
+
+def find_nemesis(h2h: HeadToHead, player: str,
+                 n: int = 5) -> List[Dict[str, Union[str, float, int]]]:
+    """
+    Args:
+        h2h (HeadToHead): Result counts of all pairings (see compute_head_to_head).
+        player (string): Name of the player.
+        n (int): Number of opponents to be returned.
+    Return:
+        Sorted list of opponents with the worst score against them, each as a dictionary
+        with name of the opponent, aggregate score and number of matches played.
+    """
+    return rank_opponents(h2h, player, n, ascending=True)
+
+
+def find_victims(h2h: HeadToHead, player: str,
+                 n: int = 5) -> List[Dict[str, Union[str, float, int]]]:
+    """
+    Args:
+        h2h (HeadToHead): Result counts of all pairings (see compute_head_to_head).
+        player (string): Name of the player.
+        n (int): Number of opponents to be returned.
+    Return:
+        Sorted list of opponents with the best score against them, each as a dictionary
+        with name of the opponent, aggregate score and number of matches played.
+    """
+    return rank_opponents(h2h, player, n, ascending=False)
+
+
+def head_to_head_archive(h2h: HeadToHead) -> bytes:
+    """ Pack the head-to-head data as npz archive, to be used without recomputing it.
+    Args:
+        h2h (HeadToHead): Result counts of all pairings (see compute_head_to_head).
+    Returns:
+        bytes: Content of the archive.
+    """
+    n_matches = h2h['counts'].sum(axis=2)
+    with np.errstate(invalid='ignore'):  # pairs that never met have no score (nan)
+        score = h2h['counts'] @ np.array([-6, -3, 0, 0, 3, 0, 6]) / n_matches
+
+    return npz_archive({'players': np.array(list(h2h['player_ids'])), 'counts': h2h['counts'],
+                        'score': score, 'n_matches': n_matches})
+
+
+def get_scores(data: Union[pd.DataFrame, History]
+               ) -> Dict[str, Dict[str, Union[float, List[Dict[int, float]]]]]:
     """ From pandas DataFrame with the complete history, compute scores for
         every player in terms of % of the possible points in every round.
     Args:
-        Pandas DataFrame with 'player', 'round' and '%' columns.
+        History or pandas DataFrame with 'player', 'round' and '%' columns.
     Return:
         Dictionary of player names, for each a dictionary with the average,
         total and list of scores.
     """
+    df = as_frame(data)
 
     # aggregated score => a more pandas way to do this?
     # datagroup = data.groupby('player')['%'].agg(['mean', 'sum'])
@@ -207,64 +618,129 @@ def get_scores(df: pd.DataFrame) -> Dict[str, Dict[str, Union[float, List[Dict[i
     return scores
 
 
-def compute_Elo_scores(df: pd.DataFrame) -> List[Dict[str, float]]:
-    """ Compute Elo ratings for all players, based on history from a pandas
-        DataFrame.
+def compute_Elo_scores(data: Union[pd.DataFrame, History],
+                       Elo: Optional[NDArray[np.float64]] = None,
+                       player_ids: Optional[Dict[str, int]] = None
+                       ) -> Tuple[NDArray[np.float64], Dict[str, int]]:
+    """ Compute Elo ratings for all players, based on the history (History or pandas
+        DataFrame). The update of every round is computed from the matrix of
+        expected scores of all pairings in the round.
     Args:
-        Pandas DataFrame with 'player', 'round' and 'result_*' columns.
+        History or pandas DataFrame with 'player', 'round' and 'result_*' columns.
+        Elo (optional): Ratings of earlier rounds to continue from, shape
+            (rounds+1, players); the last row is the state before the first
+            round in the DataFrame.
+        player_ids (optional): Column of every player in Elo.
     Return:
-        List of dictionaries with Elo scores for every player for all rounds
-        (chronological) .
+        Array with Elo scores for every player for all rounds (chronological,
+        shape (rounds+1, players)) and dictionary with the column of every player.
     """
+    start_Elo = ELO_START
+    update_factor = ELO_UPDATE_FACTOR
+    divisor = ELO_DIVISOR
 
-    def expected_score(rating_opponent: float, rating_player: float) -> float:
-        """ Expected score, given the ratings of the opponents, to be compared
-            with the actual result of the match.
-        Args:
-            Elo ratings of the two opponents of a match. (both float)
-        Return:
-            Expected result of the match. (float)
-        """
-        return 1 / (1 + 10**((rating_opponent-rating_player)/512))
+    rounds = as_history(data)
+    player_ids = dict(player_ids) if player_ids is not None else {}
+    for player in history_players(rounds):
+        player_ids.setdefault(str(player), len(player_ids))
 
-    start_Elo = 1600.
-    update_factor = 8
+    # "state before the first round" (or the earlier history) plus one row per round
+    n_previous = 1 if Elo is None else Elo.shape[0]
+    history = np.full((n_previous + len(rounds['rounds']), len(player_ids)), start_Elo)
+    if Elo is not None:
+        history[:n_previous, :Elo.shape[1]] = Elo
 
-    # initialize list with start_Elo for all players in data "state before the first round"
-    Elo = [{str(player): start_Elo for player in df['player'].unique()}]
+    code_ids = np.array([player_ids.get(str(player), -1) for player in rounds['players']],
+                        dtype=int)
+    ids_all = code_ids[rounds['player_codes']]
 
     # iterate through rounds to update the scores
-    for round, round_data in df.groupby('round'):
-        player_list = round_data['player'].to_list()
-        results = round_data.loc[:, round_data.columns.str.startswith('result_')].to_numpy()
-        # round 65 has additional column 'bonus'
-        results = results[:results.shape[0], :results.shape[0]]
+    for k in range(len(rounds['rounds'])):
+        i = n_previous - 1 + k
+        ids = ids_all[rounds['offsets'][k]:rounds['offsets'][k + 1]]
+        results = round_results(rounds, k).astype(float)
         # fix diagonal values (also important for self vs. self!)
         np.fill_diagonal(results, 1)
         results = results / (results + results.T)  # scale results as score
 
-        update = Elo[-1].copy()
-        for player in player_list:
-            index = player_list.index(player)
-            for opponent in player_list:  # also compares each player to themselves, but that's ok
-                result = results[index, player_list.index(opponent)]
-                update[player] += update_factor * \
-                    (result - expected_score(Elo[-1]
-                     [opponent], Elo[-1][player]))
+        # a player listed twice in a round (round 107) always uses their first row / column
+        _, first_index, inverse = np.unique(ids, return_index=True, return_inverse=True)
+        first = first_index[inverse]
+        results = results[np.ix_(first, first)]
+
+        # expected[p, o]: expected score of player p against opponent o
+        # (float_power is used as it matches python's ** bit for bit)
+        ratings = history[i, ids]
+        expected = 1 / (1 + np.float_power(10, (ratings[np.newaxis, :] - ratings[:, np.newaxis])
+                                           / divisor))
+        update = update_factor * (results - expected)
 
-        Elo.append(update)
+        # add the updates one opponent at a time (cumsum), like the match-by-match definition
+        updated = np.cumsum(np.column_stack([ratings, update]), axis=1)[:, -1]
+        for repeat in np.flatnonzero(first != np.arange(len(ids))):
+            updated[first[repeat]] = np.cumsum(np.append(updated[first[repeat]],
+                                                         update[repeat]))[-1]
 
-    return Elo
+        history[i + 1] = history[i]
+        history[i + 1, ids] = updated[first]
 
+    return history, player_ids
 
-def count_rounds(df: pd.DataFrame) -> Dict[str, Dict[str, int]]:
+
+def update_Elo_scores(data: Union[pd.DataFrame, History],
+                      changed_rounds: List[int]) -> Tuple[NDArray[np.float64], Dict[str, int]]:
+    """ Compute Elo ratings like compute_Elo_scores, but continue from the checkpoint of the
+        last run: only rounds from the first changed one on are replayed. The checkpoint is
+        updated afterwards.
+    Args:
+        data (History or pd.DataFrame): Full history with 'player', 'round' and 'result_*'
+            columns.
+        changed_rounds (List[int]): Rounds that changed since the last run (see changed_rounds).
+    Returns:
+        Tuple[NDArray[np.float64], Dict[str, int]]: Elo scores for every player for all rounds
+            (chronological) and the column of every player.
+    """
+    history = as_history(data)
+    checkpoint_file = f"{CACHE_DIR}/elo_checkpoint.npz"
+    checkpoint_rounds: List[int] = []
+    Elo, player_ids = None, None
+    parameters = np.array([ELO_START, ELO_UPDATE_FACTOR, ELO_DIVISOR], dtype=float)
+    if os.path.exists(checkpoint_file):
+        with np.load(checkpoint_file) as checkpoint:
+            # ratings computed with other parameters cannot be continued
+            if ('parameters' in checkpoint
+                    and np.array_equal(checkpoint['parameters'], parameters)):
+                checkpoint_rounds = checkpoint['rounds'].tolist()
+                Elo = checkpoint['elo']
+                player_ids = {str(p): i for i, p in enumerate(checkpoint['players'])}
+
+    # keep the checkpointed states up to the first round that differs from the last run
+    rounds = history['rounds'].tolist()
+    n_keep = 0
+    for round_checkpoint, round in zip(checkpoint_rounds, rounds):
+        if round_checkpoint != round or round in changed_rounds:
+            break
+        n_keep += 1
+
+    Elo, player_ids = compute_Elo_scores(select_rounds(history, rounds[n_keep:]),
+                                         None if Elo is None else Elo[:n_keep + 1],
+                                         player_ids)
+
+    np.savez(checkpoint_file, rounds=np.array(rounds), elo=Elo,
+             players=np.array(list(player_ids)), parameters=parameters)
+
+    return Elo, player_ids
+
+
+def count_rounds(data: Union[pd.DataFrame, History]) -> Dict[str, Dict[str, int]]:
     """ From a history DataFrame, extract the numbers of rounds each player has played / won.
     Args:
-        df (pandas DataFrame): 'player' and 'place' columns.
+        data (History or pandas DataFrame): 'player' and 'place' columns.
     Return:
         Dictionary, for each player a dictionary with number of rounds played
         and number of rounds won.
     """
+    df = as_frame(data)
     rounds_played_won = {}
     for player, player_data in df[['player', 'place']].groupby('player'):
         rounds_played_won[str(player)] = {'played': len(player_data),
@@ -273,97 +749,178 @@ def count_rounds(df: pd.DataFrame) -> Dict[str, Dict[str, int]]:
     return rounds_played_won
 
 
-def check_for_badges(df: pd.DataFrame) -> Dict[str, List[Badge]]:
-    """ From the data, generate a dictionary of all players with the badges they earned.
+def compress_artifact(content_bytes: bytes) -> Dict[str, bytes]:
+    """ Precompressed variants of an artifact, by file suffix (see COMPRESSED_SUFFIXES).
     Args:
-        df (pd.DataFrame): Data to crunch.
+        content_bytes (bytes): Content of the artifact.
     Returns:
-        Dict[str, List[Dict[str, Union[str, int, List[int]]]]]: List of badges for each player.
+        Dict[str, bytes]: Content of the compressed siblings (reproducible, no timestamps).
     """
-    badges: Dict[str, List[Badge]] = {player: []
-                                      for player in df['player'].unique()}
-
-    # 1) prefect round: 100% score in a round
-    perfect_rounds = df[np.isclose(df['%'], 100.0, atol=0.001)].groupby('player')[
-        'round'].apply(list)
-
-    for player, pr_list in perfect_rounds.items():
-        badges[str(player)] += cast(List[Badge], [{'type': 'perfect_round',
-                                                   'label': 'Perfekte Runde',
-                                                   'description': f"Runde {pr}"} for pr in pr_list])
-
-    # 2) all draws in a round (02 and 03)
-    for round, round_df in df.groupby('round'):
-        player_names = round_df['player'].tolist()
-        results = round_df[[f"result_{i}" for i in range(
-            len(player_names))]].to_numpy()
-
-        for player, res in zip(player_names, results):
-            if np.isin(res, [2, 3]).all():
-                badges[str(player)] += cast(List[Badge], [{'type': 'all_draws',
-                                                           'label': 'Unentschieden!',
-                                                           'description': f"Runde {round}"}])
-
-    # 3) win streak (watch out for tied wins!)
-    def group_consecutive(nums: List[int]) -> List[List[int]]:
-        """ From a sorted, unique list of integers, create a list of lists of consecutive integers.
-        Args:
-            nums (List[int]): List of integers, sorted and unique.
-        Returns:
-            List[List[int]]: List of lists of consecutive integers.
-        """
-        result = [[nums[0]]]
-
-        for num in nums[1:]:
-            if num == result[-1][-1] + 1:
-                result[-1].append(num)
-            else:
-                result.append([num])
-
-        return result
-
-    rounds_winners = df[['round', 'player', 'place']].loc[df['place'] == 1]
-    for player, rounds in (rounds_winners.groupby('player')['round']
-                           .apply(lambda x: sorted(x)).items()):
-        streaks = group_consecutive(rounds)
-        badges[str(player)] += cast(List[Badge], [{'type': 'streak',
-                                                   'label': f"Gewinnserie {len(s)}",
-                                                   'description': f"{s[0]} - {s[-1]}"}
-                                                   for s in streaks if len(s) > 1])
-
-    # 4) something with the player index in each round?
-
-    return badges
-
+    variants = {'.gz': gzip.compress(content_bytes, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content_bytes, quality=BROTLI_QUALITY)
+
+    return variants
+
+
+def publish_artifacts(artifacts: Dict[str, Any], roots: List[str], compact: bool = False,
+                      compressed_roots: Optional[List[str]] = None,
+                      removed: Optional[List[str]] = None,
+                      artifact_roots: Optional[Dict[str, List[str]]] = None
+                      ) -> Dict[str, List[str]]:
+    """ Serialize every artifact once and write it to all output roots. Files whose content
+        would not change are not touched, all others are replaced atomically. Artifacts that
+        no longer exist are deleted. Finally the manifest of every root (PUBLISH_MANIFEST) is
+        updated with the hashes of the artifacts, once all of them are in place.
+    Args:
+        artifacts (Dict[str, Any]): JSON data (or raw bytes) of every artifact, by path
+            relative to the roots.
+        roots (List[str]): Output directories.
+        compact (bool): Write JSON without indentation and whitespace (opt-in, see main).
+        compressed_roots (List[str]): Roots that also get compressed siblings of the
+            artifacts matching COMPRESSED_ARTIFACTS, written after the artifact itself
+            (outdated siblings of the other artifacts are removed).
+        removed (List[str]): Paths of artifacts to delete from all roots (with their
+            siblings and manifest entries), e.g. of rounds whose raw file was removed.
+        artifact_roots (Dict[str, List[str]]): Roots of the artifacts that are not written
+            to all roots (a subset of roots), by path.
+    Returns:
+        Dict[str, List[str]]: Paths of the files that were 'written', 'unchanged' and
+            'removed'.
+    """
+    summary: Dict[str, List[str]] = {'written': [], 'unchanged': [], 'removed': []}
+    digests: Dict[str, str] = {}
+    for path, payload in artifacts.items():
+        if isinstance(payload, bytes):
+            content_bytes = payload
+        elif compact:
+            content_bytes = json.dumps(payload, ensure_ascii=False,
+                                       separators=(',', ':')).encode('utf-8')
+        else:
+            content_bytes = json.dumps(payload, ensure_ascii=False, indent=4).encode('utf-8')
+        digest = hashlib.sha256(content_bytes).hexdigest()
+        digests[path] = digest
+        variants: Dict[str, bytes] = {}  # compressed once, on first use
+
+        for root in (artifact_roots or {}).get(path, roots):
+            file_name = os.path.join(root, path)
+            compressed = root in (compressed_roots or [])
+            suffixes = COMPRESSED_SUFFIXES if (compressed and any(
+                fnmatch(path, pattern) for pattern in COMPRESSED_ARTIFACTS)) else []
+            if compressed and not suffixes:  # siblings written by an earlier version
+                for suffix in COMPRESSED_SUFFIXES:
+                    if os.path.exists(f"{file_name}{suffix}"):
+                        os.remove(f"{file_name}{suffix}")
+
+            if (os.path.exists(file_name) and file_hash(file_name) == digest
+                    and all(os.path.exists(f"{file_name}{s}") for s in suffixes)):
+                summary['unchanged'].append(file_name)
+                continue
+
+            os.makedirs(os.path.dirname(file_name), exist_ok=True)
+            with open(f"{file_name}.tmp", 'wb') as file:
+                file.write(content_bytes)
+            os.replace(f"{file_name}.tmp", file_name)
+            summary['written'].append(file_name)
+
+            if suffixes and not variants:
+                variants = compress_artifact(content_bytes)
+            for suffix in suffixes:
+                with open(f"{file_name}{suffix}.tmp", 'wb') as file:
+                    file.write(variants[suffix])
+                os.replace(f"{file_name}{suffix}.tmp", f"{file_name}{suffix}")
+
+    for path in removed or []:
+        for root in roots:
+            file_name = os.path.join(root, path)
+            if os.path.exists(file_name):
+                os.remove(file_name)
+                summary['removed'].append(file_name)
+            for suffix in COMPRESSED_SUFFIXES:
+                if os.path.exists(f"{file_name}{suffix}"):
+                    os.remove(f"{file_name}{suffix}")
+
+    for root in roots:
+        manifest_file = os.path.join(root, PUBLISH_MANIFEST)
+        manifest: Dict[str, str] = {}
+        if os.path.exists(manifest_file):
+            with open(manifest_file, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+
+        # artifacts published earlier (e.g. unchanged rounds) are kept while their file exists
+        root_digests = {path: digest for path, digest in digests.items()
+                        if root in (artifact_roots or {}).get(path, roots)}
+        new_manifest = {path: digest for path, digest in {**manifest, **root_digests}.items()
+                        if os.path.exists(os.path.join(root, path))}
+        if new_manifest != manifest:
+            with open(f"{manifest_file}.tmp", 'w', encoding='utf-8') as file:
+                json.dump(new_manifest, file, ensure_ascii=False, indent=4, sort_keys=True)
+            os.replace(f"{manifest_file}.tmp", manifest_file)
+
+    return summary
+
+
+def published_artifacts(root: str) -> List[str]:
+    """ Paths of the artifacts listed in the manifest of an output root (see
+        publish_artifacts), empty if nothing was published there yet.
+    """
+    manifest_file = os.path.join(root, PUBLISH_MANIFEST)
+    if not os.path.exists(manifest_file):
+        return []
+    with open(manifest_file, 'r', encoding='utf-8') as file:
+        return list(json.load(file))
 
-if __name__ == '__main__':
-    data = load_data()
 
-    all_players = data['player'].unique()
-    Elo = compute_Elo_scores(data)
+def main(args: List[str]) -> None:
+    """ Crunch the raw data and publish all JSON artifacts for the API.
+    Args:
+        args (List[str]): Command line flags; --incremental only parses changed raw files and
+            republishes (and replays Elo from) the rounds changed since the last successful
+            publication, --compact publishes JSON without indentation (opt-in: no build
+            script passes it, the checked-in artifacts are indented).
+    """
+    incremental = '--incremental' in args
+    compact = '--compact' in args
+    published = load_published_state() if incremental else {}
+    data, hashes = load_rounds(use_cache=incremental)
+    changed = changed_rounds(published, hashes)
+
+    all_players = history_players(data)
+    Elo, player_ids = update_Elo_scores(data, changed)
     scores = get_scores(data)
     rounds_played_won = count_rounds(data)
     mp_cards = most_played_cards(data)
-    badges = check_for_badges(data)
+    badges = update_badges(data, changed, f"{CACHE_DIR}/badges.pkl")
+    h2h = compute_head_to_head(data)
+
+    if incremental and os.path.exists(MATCH_TABLE_FILE):
+        match_data = update_match_table(load_match_table(), data, changed)
+    else:
+        match_data = build_match_table(data)
 
-    with open('data/popular_cards.json', 'w', encoding='utf-8') as file:
-        json.dump(mp_cards['overall'], file, ensure_ascii=False, indent=4)
-    with open('../frontend/src/data/popular_cards.json', 'w', encoding='utf-8') as file:
-        json.dump(mp_cards['overall'], file, ensure_ascii=False, indent=4)
+    # archives for the dashboard (and the next incremental run), only needed next to the API
+    archives = {'head_to_head.npz': head_to_head_archive(h2h),
+                MATCH_TABLE_ARTIFACT: match_table_archive(match_data)}
+
+    # JSON data (or raw bytes) to publish, by path relative to the output roots
+    artifacts: Dict[str, Any] = {}
+
+    # Elo history of all players as one matrix, sliced by the API, frontend and dashboard
+    artifacts[ELO_FILE], artifacts[ELO_INDEX_FILE] = elo_artifacts(Elo, player_ids,
+                                                                   data['rounds'].tolist())
+
+    artifacts['popular_cards.json'] = mp_cards['overall']
+    artifacts['card_index.json'] = build_card_index(data)
 
     ### prepare list of all players and round numbers ###
-    all_players_sorted = all_players.tolist()
+    all_players_sorted = list(all_players)
     all_players_sorted.sort(key=lambda p: re.sub(
         r'[^a-zA-Z0-9]', '', p).lower())
     round_numbers_sorted = sorted(
-        data['round'].unique().tolist(), key=lambda x: -x)
+        data['rounds'].tolist(), key=lambda x: -x)
     # possibly also with pandas.DataFrame.to_json (?)
-    with open('data/players_rounds_lists.json', 'w', encoding='utf-8') as file:
-        json.dump({'player_names': all_players_sorted,
-                  'round_numbers': round_numbers_sorted}, file, ensure_ascii=False, indent=4)
-    with open('../frontend/src/data/players_rounds_lists.json', 'w', encoding='utf-8') as file:
-        json.dump({'player_names': all_players_sorted,
-                  'round_numbers': round_numbers_sorted}, file, ensure_ascii=False, indent=4)
+    artifacts['players_rounds_lists.json'] = {'player_names': all_players_sorted,
+                                              'round_numbers': round_numbers_sorted}
 
     ### prepare hall of fame data ###
     table_data = [{'player': p,
@@ -371,11 +928,12 @@ if __name__ == '__main__':
                    'score_sum': f"{scores[p]['total']:.2f}",
                    'rounds_played': rounds_played_won[p]['played'],
                    'wins': rounds_played_won[p]['won'],
-                   'elo': f"{Elo[-1][p]:.2f}"
+                   'elo': f"{Elo[-1, player_ids[p]]:.2f}"
                    } for p in all_players]
 
     # winners of every round (a round can have multiple winners)
-    round_winners_df = data[['place', 'round', 'player']].loc[data['place'] == 1].groupby(
+    frame = history_frame(data)
+    round_winners_df = frame[['place', 'round', 'player']].loc[frame['place'] == 1].groupby(
         'round')['player'].aggregate(lambda x: list(x))
     round_winners = [{'round': r,
                       'winner': sorted(w, key=lambda x: re.sub(r'[^a-zA-Z0-9]', '', x).lower())
@@ -384,56 +942,41 @@ if __name__ == '__main__':
     round_winners.sort(key=lambda x: -x['round'])
 
     # possibly also with pandas.DataFrame.to_json (?)
-    with open('data/hall_of_fame.json', 'w', encoding='utf-8') as file:
-        json.dump({'table': table_data, 'rounds': round_winners},
-                  file, ensure_ascii=False, indent=4)
-    with open('../frontend/src/data/hall_of_fame.json', 'w', encoding='utf-8') as file:
-        json.dump({'table': table_data, 'rounds': round_winners},
-                  file, ensure_ascii=False, indent=4)
+    artifacts['hall_of_fame.json'] = {'table': table_data, 'rounds': round_winners}
 
     ### prepare player data ###
     for player in all_players:
         player_data = {'cards': mp_cards[player][:5],
                        'n_rounds_played': rounds_played_won[player]['played'],
                        'n_wins': rounds_played_won[player]['won'],
-                       'nemesis': find_nemesis(data, player, 5),
-                       'elo': Elo[-1][player],
+                       'nemesis': find_nemesis(h2h, player, 5),
+                       'victims': find_victims(h2h, player, 5),
+                       'elo': float(Elo[-1, player_ids[player]]),
                        'score_average': scores[player]['average'],
                        'score_total': scores[player]['total'],
-                       'elo_list': [e[player] for e in Elo],
                        'badges': badges[player]}
 
         # possibly also with pandas.DataFrame.to_json (?)
-        with open(f"data/players/{player}.json", 'w', encoding='utf-8') as file:
-            json.dump(player_data, file, ensure_ascii=False, indent=4)
-        with open(f"../frontend/src/data/players/{player}.json", 'w', encoding='utf-8') as file:
-            json.dump(player_data, file, ensure_ascii=False, indent=4)
+        artifacts[f"players/{player}.json"] = player_data
 
     ### prepare round data ###
     with open('data/urls.json') as file:
         urls = json.load(file)
 
-    for round in data['round'].unique():
-        data_df = data.loc[data['round'] == round]
+    for k, round in enumerate(data['rounds'].tolist()):
+        if round not in changed:  # round data only depends on the round itself
+            continue
+
+        rows = slice(data['offsets'][k], data['offsets'][k + 1])
 
-        players = data_df['player'].to_list()
-        deck_list = data_df.loc[:, data_df.columns.str.startswith(
-            'card_')].to_numpy().tolist()
+        players = data['players'][data['player_codes'][rows]].tolist()
+        deck_list = data['card_codes'][rows].tolist()
         round_data = {'decks': [{'index': i+1, 'player': p, 'cards': [
-            c for c in d if isinstance(c, str)]}
+            data['cards'][c] for c in d if c >= 0]}
             for i, (p, d) in enumerate(zip(players, deck_list))]}
 
-        result_cols = sorted(
-            [c for c in data_df.columns if c.startswith('result_')],
-            key=lambda x: int(x.split('_')[1])
-        )
-        ordered_cols = result_cols + ['sum']
-
-        results_list = (data_df[ordered_cols]
-                        .dropna(how='any', axis=1)
-                        .to_numpy(dtype=int)
-                        .tolist()
-                        )
+        results_list = np.column_stack([round_results(data, k),
+                                        data['sum'][rows]]).tolist()
         round_data['results'] = [{'index': i+1, 'values': l}
                                  for i, l in enumerate(results_list)]
 
@@ -444,7 +987,25 @@ if __name__ == '__main__':
         # json['deadline'] =
 
         # possibly also with pandas.DataFrame.to_json (?)
-        with open(f"data/rounds/{round}.json", 'w', encoding='utf-8') as file:
-            json.dump(round_data, file, ensure_ascii=False, indent=4)
-        with open(f"../frontend/src/data/rounds/{round}.json", 'w', encoding='utf-8') as file:
-            json.dump(round_data, file, ensure_ascii=False, indent=4)
+        artifacts[f"rounds/{round}.json"] = round_data
+
+    # rounds whose raw file was removed (or is no longer valid), players without rounds
+    removed = [f"rounds/{round}.json" for round in changed
+               if round not in data['rounds'].tolist()]
+    removed += [path for path in published_artifacts(OUTPUT_ROOTS[0])
+                if path.startswith('players/') and path not in artifacts]
+
+    # one call, so that the manifests change once, after all artifacts are in place
+    summary = publish_artifacts({**archives, **artifacts}, OUTPUT_ROOTS, compact,
+                                COMPRESSED_ROOTS, removed,
+                                {path: ARCHIVE_ROOTS for path in archives})
+    save_published_state(hashes)
+    print(f"Published {len(archives) + len(artifacts)} artifacts: "
+          f"{len(summary['written'])} files written, {len(summary['unchanged'])} unchanged, "
+          f"{len(summary['removed'])} removed.")
+    for file_name in summary['written']:
+        print(f"  {file_name}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
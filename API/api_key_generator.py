@@ -1,37 +1,36 @@
-import json
 import secrets
 import sys
 
+from key_store import hash_key, KEY_FILE, load_key_file, save_key_file
+
 # utility for managing API keys:
-    # GENERATE new key and save to json file
-    # REMOVE a key from the json file
+    # GENERATE new key, print it (only shown once) and save its hash to the json file
+    # REMOVE a user and all their keys from the json file
+# keys still stored in plain text are hashed whenever the file is written
 
 if __name__ == '__main__':
     try:
         match sys.argv[1]:
             case 'GENERATE':
                 user_name = sys.argv[2]
-                with open('api_keys.json', 'r') as file:
-                    key_data = json.load(file)
+                key_data = load_key_file(KEY_FILE)
 
                 new_key = secrets.token_urlsafe(16)
-                if sys.argv[2] in key_data:
-                    key_data[user_name] += [new_key]
+                if user_name in key_data:
+                    key_data[user_name] += [hash_key(new_key)]
                 else:
-                    key_data[user_name] = [new_key]
+                    key_data[user_name] = [hash_key(new_key)]
 
-                with open('api_keys.json', 'w', encoding='utf-8') as file:
-                    json.dump(key_data, file, ensure_ascii=False, indent=4)
+                save_key_file(key_data, KEY_FILE)
+                print(f"New API key for {user_name}: {new_key}")
 
             case 'REMOVE':
                 user_name = sys.argv[2]
-                with open('api_keys.json', 'r') as file:
-                    key_data = json.load(file)
+                key_data = load_key_file(KEY_FILE)
 
                 del key_data[user_name]
 
-                with open('api_keys.json', 'w', encoding='utf-8') as file:
-                    json.dump(key_data, file, ensure_ascii=False, indent=4)
+                save_key_file(key_data, KEY_FILE)
             #case _:
             #    print('No option chosen.')
     except:
@@ -0,0 +1,160 @@
+from io import BytesIO
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Protocol, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+import requests
+
+from disk_cache import DiskCache
+
+# source of the card art (a local fake in tests)
+SCRYFALL_API = os.environ.get('SCRYFALL_API', 'https://api.scryfall.com')
+# size of the badge image (pixels)
+BADGE_SIZE = (600, 125)
+# change when the layout of the badge changes, so that cached badges are rendered again
+BADGE_VERSION = 1
+# root of the caches (relative to the data directory, or absolute, e.g. a temporary directory
+# in tests): card art by card name, badges rendered on request
+IMAGE_CACHE_ROOT = os.environ.get('IMAGE_CACHE_ROOT', 'cache')
+ART_CACHE_DIR = 'card_art'
+ART_CACHE_BYTES = 64 * 2**20
+BADGE_CACHE_DIR = 'badges'
+BADGE_CACHE_BYTES = 32 * 2**20
+# pre-rendered badges (see prerender_badges.py) and their index, below the data directory
+PRERENDERED_DIR = 'badges'
+PRERENDERED_INDEX = 'badges/index.json'
+
+
+class ArtFetcher(Protocol):
+    """ Source of card art, e.g. ScryfallFetcher or a local fake in tests. """
+
+    def fetch(self, card_name: str) -> bytes:
+        """ Image file of the art of a card; raises an exception if it cannot be fetched. """
+
+
+class ScryfallFetcher:
+    """ Art crop of the oldest print of a card, from the Scryfall API (three requests: card,
+        its prints, the image), with timeouts on every request.
+    """
+
+    def __init__(self, base_url: str = SCRYFALL_API,
+                 timeout: Tuple[float, float] = (3.05, 10.)):
+        """ Prepare a session (connections are reused for the three requests).
+        Args:
+            base_url (str): Scryfall API (or a local fake).
+            timeout (Tuple[float, float]): Connect and read timeout of every request (seconds).
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def fetch(self, card_name: str) -> bytes:
+        # get list of prints
+        response = self.session.get(f"{self.base_url}/cards/named", params={'exact': card_name},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+
+        # get image of oldest print
+        response = self.session.get(response.json()['prints_search_uri'], timeout=self.timeout)
+        response.raise_for_status()
+        img_uri = response.json()['data'][-1]['image_uris']['art_crop']
+
+        response = self.session.get(img_uri, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+
+class CardArt:
+    """ Card art from a fetcher, kept in an on-disk LRU cache by card name. """
+
+    def __init__(self, fetcher: ArtFetcher, cache: DiskCache):
+        self.fetcher = fetcher
+        self.cache = cache
+
+    def get(self, card_name: str) -> Optional[bytes]:
+        """ Art of a card, fetched only if it is not cached.
+        Args:
+            card_name (str): Name of the card.
+        Returns:
+            Optional[bytes]: Image file of the art, None if it could not be fetched.
+        """
+        art = self.cache.get(card_name)
+        if art is None:
+            try:
+                art = self.fetcher.fetch(card_name)
+                Image.open(BytesIO(art)).verify()  # only cache images
+            except (requests.RequestException, LookupError, ValueError, OSError):
+                return None
+            self.cache.put(card_name, art)
+
+        return art
+
+
+def cache_dir(data_dir: Path, name: str) -> Path:
+    """ Directory of one of the caches (ART_CACHE_DIR or BADGE_CACHE_DIR below
+        IMAGE_CACHE_ROOT).
+    Args:
+        data_dir (Path): Data directory, the base of a relative IMAGE_CACHE_ROOT.
+        name (str): Name of the cache.
+    Returns:
+        Path: Directory of the cached files.
+    """
+    return Path(data_dir) / IMAGE_CACHE_ROOT / name
+
+
+def badge_key(player: str, data_hash: str) -> str:
+    """ Cache key of a badge: changes with the player's data and the layout.
+    Args:
+        player (str): Name of the player.
+        data_hash (str): Hash of the player's data (e.g. the ETag of the player artifact).
+    Returns:
+        str: Key of the rendered badge.
+    """
+    return f"{BADGE_VERSION}/{player}/{data_hash}"
+
+
+def badge_card(player_data: Dict[str, Any]) -> Optional[str]:
+    """ Card shown on the badge: the player's most played card (None if they have none). """
+    cards = player_data.get('cards', [])
+    return cards[0]['card'] if cards else None
+
+
+def load_font(size: int = 16) -> ImageFont.ImageFont:
+    """ Font of the badge text (the default font if arial.ttf is not available). """
+    # Load a font (make sure to have a .ttf file in your directory or use a default one)
+    try:
+        return ImageFont.truetype('arial.ttf', size)
+    except IOError:
+        return ImageFont.load_default()
+
+
+def render_badge(player: str, art: Optional[bytes], font: ImageFont.ImageFont) -> bytes:
+    """ Create a badge to use on social media for the player.
+    Args:
+        player (str): Name of the player.
+        art (Optional[bytes]): Image file of the card art to show (None for no art).
+        font (ImageFont.ImageFont): Font of the text (see load_font).
+    Returns:
+        bytes: PNG file of the badge.
+    """
+    image = Image.new('RGB', BADGE_SIZE, color='#888')
+    draw = ImageDraw.Draw(image)
+
+    if art is not None:
+        card_image = Image.open(BytesIO(art))
+        card_image.thumbnail((100, 100))  # Resize if needed (max sizes)
+        image.paste(card_image, (180, 10))  # Paste onto the badge
+
+    # Draw badge information
+    draw.text((10, 10), f"Badge: {player}", font=font, fill="black")
+    draw.text((10, 40), "some other text", font=font, fill="black")
+
+    # Optionally, add a badge image if you have a specific one
+    # badge_image = Image.open(requests.get(badge['image_url'], stream=True).raw)
+    # image.paste(badge_image, (180, 50))
+
+    byte_io = BytesIO()
+    image.save(byte_io, 'PNG')
+
+    return byte_io.getvalue()
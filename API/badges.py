@@ -0,0 +1,230 @@
+import os
+from typing import Callable, Dict, List, Optional, TypedDict, Union
+
+import numpy as np
+import pandas as pd
+
+from history import (as_history, History, history_players, result_positions, round_sizes,
+                     row_positions, select_rounds)
+
+
+class BaseBadge(TypedDict):
+    """ Basic Badge class, holding only the type of badge. This ensures that the type is always
+        given.
+    """
+    type: str
+
+
+class Badge(BaseBadge, total=False):
+    """ Actual Badge class for usage, defining all optional fields of the different badge types.
+    """
+    label: str
+    description: str
+
+
+class BadgeRule(TypedDict):
+    """ Registered badge type. find returns one row ('player', 'start', 'end') for every badge
+        earned in the given rounds (a History with derived columns); label and description are
+        formatted with start, end and length. Records of an extending rule are merged when
+        they cover consecutive rounds.
+    """
+    find: Callable[[History], pd.DataFrame]
+    label: str
+    description: str
+    min_length: int
+    extends: bool
+
+
+# all badge types, in the order in which they are listed for a player
+# (more ideas: something with the player index in each round?)
+BADGE_RULES: Dict[str, BadgeRule] = {}
+# change when a rule finds other badges than before, so that stored records are recomputed
+BADGE_RULES_VERSION = 2
+
+
+def badge_rule(badge_type: str, label: str, description: str, min_length: int = 1,
+               extends: bool = False) -> Callable[[Callable[[History], pd.DataFrame]],
+                                                  Callable[[History], pd.DataFrame]]:
+    """ Register a function as rule for a type of badge (see BadgeRule).
+    Args:
+        badge_type (str): Type of the badge.
+        label (str): Format string of the label.
+        description (str): Format string of the description.
+        min_length (int): Minimum number of rounds for a record to count as badge.
+        extends (bool): Merge records of consecutive rounds (streaks).
+    Returns:
+        Decorator registering the rule.
+    """
+    def register(find: Callable[[History], pd.DataFrame]) -> Callable[[History], pd.DataFrame]:
+        BADGE_RULES[badge_type] = {'find': find, 'label': label, 'description': description,
+                                   'min_length': min_length, 'extends': extends}
+        return find
+
+    return register
+
+
+def rows_to_records(history: History, found: np.ndarray) -> pd.DataFrame:
+    """ Records of single rounds for the given rows of the history.
+    Args:
+        history (History): Rounds searched for badges.
+        found (np.ndarray): Boolean mask of the rows with a badge.
+    Returns:
+        pd.DataFrame: 'player', 'start' and 'end' of every found row.
+    """
+    rounds = np.repeat(history['rounds'], round_sizes(history))[found]
+
+    return pd.DataFrame({'player': history['players'][history['player_codes'][found]],
+                         'start': rounds, 'end': rounds})
+
+
+@badge_rule('perfect_round', 'Perfekte Runde', 'Runde {start}')
+def find_perfect_rounds(history: History) -> pd.DataFrame:
+    """ 100% score in a round. """
+    return rows_to_records(history, np.isclose(history['percent'], 100.0, atol=0.001))
+
+
+@badge_rule('all_draws', 'Unentschieden!', 'Runde {start}')
+def find_all_draws(history: History) -> pd.DataFrame:
+    """ All matches of a round drawn (02 and 03). Changed in BADGE_RULES_VERSION 2: the
+        diagonal was counted before, so the badge was never awarded (see test_badges.py).
+    """
+    # only the opponents of the round count, not the diagonal (always 0)
+    rows, columns = result_positions(history)
+    is_other = (columns != row_positions(history)[rows]) & ~np.isin(history['results'], [2, 3])
+    n_other = np.bincount(rows, weights=is_other, minlength=len(history['player_codes']))
+
+    return rows_to_records(history, n_other == 0)
+
+
+@badge_rule('streak', 'Gewinnserie {length}', '{start} - {end}', min_length=2, extends=True)
+def find_win_streaks(history: History) -> pd.DataFrame:
+    """ Wins in consecutive rounds (watch out for tied wins!). Single wins are kept as well,
+        so that later rounds can extend them.
+    """
+    wins = rows_to_records(history, history['place'] == 1).drop_duplicates()
+
+    return merge_consecutive(wins)
+
+
+def merge_consecutive(records: pd.DataFrame) -> pd.DataFrame:
+    """ Merge records of the same player covering consecutive rounds.
+    Args:
+        records (pd.DataFrame): 'player', 'start' and 'end' columns, without overlaps.
+    Returns:
+        pd.DataFrame: Merged records, sorted by player and start.
+    """
+    records = records.sort_values(['player', 'start'])
+    is_new = ((records['player'] != records['player'].shift())
+              | (records['start'] != records['end'].shift() + 1))
+
+    return (records.groupby(is_new.cumsum().to_numpy())
+            .agg(player=('player', 'first'), start=('start', 'min'), end=('end', 'max'))
+            .reset_index(drop=True))
+
+
+def find_badge_records(history: History) -> pd.DataFrame:
+    """ Run all registered badge rules on the given rounds.
+    Args:
+        history (History): History (or new rounds), with derived columns.
+    Returns:
+        pd.DataFrame: 'type', 'player', 'start' and 'end' of every record found.
+    """
+    records = [BADGE_RULES[badge_type]['find'](history).assign(type=badge_type)
+               for badge_type in BADGE_RULES]
+
+    return pd.concat(records, ignore_index=True)[['type', 'player', 'start', 'end']]
+
+
+def extend_badge_records(records: pd.DataFrame, new_records: pd.DataFrame) -> pd.DataFrame:
+    """ Add the records of new rounds (after all rounds in records) to existing records,
+        extending the streaks that continue.
+    Args:
+        records (pd.DataFrame): Existing records (see find_badge_records).
+        new_records (pd.DataFrame): Records of the new rounds.
+    Returns:
+        pd.DataFrame: All records.
+    """
+    combined = pd.concat([records, new_records], ignore_index=True)
+    for badge_type, rule in BADGE_RULES.items():
+        if rule['extends']:
+            is_type = combined['type'] == badge_type
+            merged = merge_consecutive(combined.loc[is_type, ['player', 'start', 'end']])
+            combined = pd.concat([combined.loc[~is_type], merged.assign(type=badge_type)],
+                                 ignore_index=True)
+
+    return combined[['type', 'player', 'start', 'end']]
+
+
+def format_badges(records: pd.DataFrame, players: List[str]) -> Dict[str, List[Badge]]:
+    """ Turn badge records into the list of badges of every player.
+    Args:
+        records (pd.DataFrame): Records of all rounds (see find_badge_records).
+        players (List[str]): Names of all players.
+    Returns:
+        Dict[str, List[Badge]]: List of badges for each player.
+    """
+    badges: Dict[str, List[Badge]] = {str(player): [] for player in players}
+
+    order = {badge_type: i for i, badge_type in enumerate(BADGE_RULES)}
+    records = records.assign(length=records['end'] - records['start'] + 1,
+                             order=records['type'].map(order))
+    records = records.loc[records['length'] >= records['type'].map(
+        {badge_type: rule['min_length'] for badge_type, rule in BADGE_RULES.items()})]
+
+    for badge_type, player, start, end, length in (records
+                                                   .sort_values(['order', 'start'], kind='stable')
+                                                   [['type', 'player', 'start', 'end', 'length']]
+                                                   .itertuples(index=False)):
+        rule = BADGE_RULES[badge_type]
+        values = {'start': start, 'end': end, 'length': length}
+        badges[str(player)].append({'type': badge_type,
+                                    'label': rule['label'].format(**values),
+                                    'description': rule['description'].format(**values)})
+
+    return badges
+
+
+def check_for_badges(data: Union[pd.DataFrame, History]) -> Dict[str, List[Badge]]:
+    """ From the data, generate a dictionary of all players with the badges they earned.
+    Args:
+        data (History or pd.DataFrame): Data to crunch, with derived columns.
+    Returns:
+        Dict[str, List[Badge]]: List of badges for each player.
+    """
+    history = as_history(data)
+
+    return format_badges(find_badge_records(history), history_players(history))
+
+
+def update_badges(data: Union[pd.DataFrame, History], changed_rounds: List[int],
+                  state_file: Optional[str] = None) -> Dict[str, List[Badge]]:
+    """ Like check_for_badges, but if only new rounds were added since the last run, the rules
+        are only evaluated for those and the stored records are extended.
+    Args:
+        data (History or pd.DataFrame): Full history, with derived columns.
+        changed_rounds (List[int]): Rounds that changed since the last run.
+        state_file (str, optional): Pickle with the records of the last run.
+    Returns:
+        Dict[str, List[Badge]]: List of badges for each player.
+    """
+    history = as_history(data)
+    records = None
+    if state_file is not None and os.path.exists(state_file):
+        records = pd.read_pickle(state_file)
+
+    if (records is not None and records.attrs.get('types') == list(BADGE_RULES)
+            and records.attrs.get('version') == BADGE_RULES_VERSION
+            and all(r > records.attrs['last_round'] for r in changed_rounds)
+            and set(changed_rounds) <= set(history['rounds'].tolist())):
+        if changed_rounds:  # only new rounds at the end
+            new_rounds = select_rounds(history, changed_rounds)
+            records = extend_badge_records(records, find_badge_records(new_rounds))
+    else:
+        records = find_badge_records(history)
+
+    if state_file is not None:
+        records.attrs = {'types': list(BADGE_RULES), 'version': BADGE_RULES_VERSION,
+                         'last_round': int(history['rounds'].max(initial=0))}
+        records.to_pickle(state_file)
+
+    return format_badges(records, history_players(history))
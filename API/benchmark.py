@@ -0,0 +1,315 @@
+""" Benchmark suite for the analysis pipeline, on synthetic tournaments.
+
+Generates a history of valid rounds (same csv schema as data/raw), runs analysis.main on a copy
+of it and records wall time, number of calls and peak memory (tracemalloc) of every stage:
+    full         all raw files parsed, no cache
+    incremental  one new round added, run with --incremental
+    noop         nothing changed, run with --incremental
+Results are written as JSON; given a baseline of an earlier run, regressions are flagged and
+the exit code is 1.
+
+Usage:
+    python benchmark.py --rounds 2000 --players 500 --output bench.json
+    python benchmark.py --rounds 2000 --players 500 --baseline bench.json
+"""
+import argparse
+from contextlib import contextmanager, redirect_stdout
+import functools
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, TypedDict
+
+import numpy as np
+import pandas as pd
+
+import analysis
+
+# functions of analysis.main measured as stages (nested calls are part of their stage)
+STAGES = ['load_rounds', 'update_Elo_scores', 'get_scores', 'count_rounds', 'most_played_cards',
+          'update_badges', 'compute_head_to_head', 'find_nemesis', 'find_victims',
+          'build_match_table', 'update_match_table', 'match_table_archive', 'build_card_index',
+          'publish_artifacts']
+
+SCENARIOS = {'full': [], 'incremental': ['--incremental'], 'noop': ['--incremental']}
+
+# possible results of a match, (points of player i, points of player j)
+LEGAL_RESULTS = np.array([[6, 0], [0, 6], [4, 1], [1, 4], [2, 2], [3, 3]])
+
+
+class StageStats(TypedDict):
+    """ Measurements of one stage (or the whole run). peak_bytes is the peak of memory
+        allocated on top of what was allocated when the stage started (0 if not traced).
+    """
+    seconds: float
+    calls: int
+    peak_bytes: int
+
+
+def generate_rounds(directory: str, n_rounds: int, n_players: int, min_size: int = 8,
+                    max_size: int = 16, n_cards: int = 2000, seed: int = 0) -> None:
+    """ Write a synthetic history of valid rounds (round_1.csv ... ) and matching urls.json.
+        Participation and card choice follow a power law, as in the real data.
+    Args:
+        directory (str): Data directory (the raw files go into its raw/ subdirectory).
+        n_rounds (int): Number of rounds.
+        n_players (int): Number of distinct players.
+        min_size (int): Minimum number of players per round.
+        max_size (int): Maximum number of players per round.
+        n_cards (int): Number of distinct cards.
+        seed (int): Seed of the random generator.
+    """
+    rng = np.random.default_rng(seed)
+    players = [f"player_{p:04d}" for p in range(n_players)]
+    cards = [f"Card {c:05d}" for c in range(n_cards)]
+    player_weights = 1. / np.arange(1, n_players + 1) ** 0.8
+    player_weights /= player_weights.sum()
+    card_weights = 1. / np.arange(1, n_cards + 1)
+    card_weights /= card_weights.sum()
+
+    os.makedirs(f"{directory}/raw", exist_ok=True)
+    for round in range(1, n_rounds + 1):
+        size = min(int(rng.integers(min_size, max_size + 1)), n_players)
+        participants = rng.choice(n_players, size, replace=False, p=player_weights)
+
+        results = np.zeros((size, size), dtype=int)
+        i, j = np.triu_indices(size, 1)
+        pairs = LEGAL_RESULTS[rng.integers(len(LEGAL_RESULTS), size=len(i))]
+        results[i, j] = pairs[:, 0]
+        results[j, i] = pairs[:, 1]
+
+        lines = [';'.join(['player', 'card_1', 'card_2', 'card_3']
+                          + [f"result_{k}" for k in range(size)] + ['round'])]
+        for p, row in zip(participants, results):
+            deck = rng.choice(n_cards, 3, replace=False, p=card_weights)
+            lines.append(';'.join([players[p]] + [cards[c] for c in deck]
+                                  + [f"{r:02d}" for r in row] + [str(round)]))
+
+        with open(f"{directory}/raw/round_{round}.csv", 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+
+    with open(f"{directory}/urls.json", 'w') as file:
+        json.dump({str(r): f"https://example.org/3cb/round/{r}" for r in range(1, n_rounds + 1)},
+                  file)
+
+
+@contextmanager
+def working_directory(path: str) -> Iterator[None]:
+    """ Temporarily change the working directory (analysis uses paths relative to API/). """
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+@contextmanager
+def measure_stages(stats: Dict[str, StageStats], trace_memory: bool) -> Iterator[None]:
+    """ Temporarily replace the stage functions of analysis with measuring wrappers.
+    Args:
+        stats (Dict[str, StageStats]): Collects the measurements, by stage.
+        trace_memory (bool): Measure peak memory (tracemalloc must be running).
+    """
+    def wrap(name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(func)
+        def measured(*args: Any, **kwargs: Any) -> Any:
+            if trace_memory:
+                base = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stage = stats.setdefault(name, {'seconds': 0., 'calls': 0, 'peak_bytes': 0})
+                stage['seconds'] += time.perf_counter() - start
+                stage['calls'] += 1
+                if trace_memory:
+                    stage['peak_bytes'] = max(stage['peak_bytes'],
+                                              tracemalloc.get_traced_memory()[1] - base)
+        return measured
+
+    originals = {name: getattr(analysis, name) for name in STAGES}
+    for name, func in originals.items():
+        setattr(analysis, name, wrap(name, func))
+    try:
+        yield
+    finally:
+        for name, func in originals.items():
+            setattr(analysis, name, func)
+
+
+def run_scenarios(source: str, trace_memory: bool) -> Dict[str, Dict[str, StageStats]]:
+    """ Run all scenarios once, on a fresh copy of the generated data.
+    Args:
+        source (str): Directory with the generated data/ and the held back new rounds (new/).
+        trace_memory (bool): Measure peak memory as well (slows down the run).
+    Returns:
+        Dict[str, Dict[str, StageStats]]: Measurements by scenario and stage ('total' included).
+    """
+    results: Dict[str, Dict[str, StageStats]] = {}
+    with tempfile.TemporaryDirectory() as work:
+        # same layout as the repository, so that all output roots end up in the work directory
+        shutil.copytree(f"{source}/data", f"{work}/API/data")
+        os.makedirs(f"{work}/frontend/src/data")
+
+        with working_directory(f"{work}/API"):
+            for scenario, args in SCENARIOS.items():
+                if scenario == 'incremental':
+                    for file_name in sorted(os.listdir(f"{source}/new")):
+                        shutil.copy(f"{source}/new/{file_name}", 'data/raw')
+
+                stats: Dict[str, StageStats] = {}
+                if trace_memory:
+                    tracemalloc.start()
+                start = time.perf_counter()
+                with measure_stages(stats, trace_memory), redirect_stdout(io.StringIO()):
+                    analysis.main(args)
+                total: StageStats = {'seconds': time.perf_counter() - start, 'calls': 1,
+                                     'peak_bytes': 0}
+                if trace_memory:
+                    total['peak_bytes'] = max([s['peak_bytes'] for s in stats.values()]
+                                              + [tracemalloc.get_traced_memory()[1]])
+                    tracemalloc.stop()
+
+                results[scenario] = {'total': total, **stats}
+
+    return results
+
+
+def benchmark(n_rounds: int, n_players: int, min_size: int = 8, max_size: int = 16,
+              n_new: int = 1, repeat: int = 3, trace_memory: bool = True,
+              seed: int = 0) -> Dict[str, Any]:
+    """ Benchmark the analysis pipeline on a synthetic tournament. Times are the best of all
+        repetitions; memory is measured in a separate run, as tracing slows everything down.
+    Args:
+        n_rounds (int): Number of rounds in the history.
+        n_players (int): Number of distinct players.
+        min_size (int): Minimum number of players per round.
+        max_size (int): Maximum number of players per round.
+        n_new (int): Number of rounds added for the incremental scenario.
+        repeat (int): Number of timed runs.
+        trace_memory (bool): Measure peak memory of every stage.
+        seed (int): Seed of the random generator.
+    Returns:
+        Dict[str, Any]: Configuration, environment and measurements by scenario and stage.
+    """
+    config = {'rounds': n_rounds, 'players': n_players, 'min_size': min_size,
+              'max_size': max_size, 'new_rounds': n_new, 'repeat': repeat, 'seed': seed}
+
+    with tempfile.TemporaryDirectory() as source:
+        start = time.perf_counter()
+        generate_rounds(f"{source}/data", n_rounds + n_new, n_players, min_size, max_size,
+                        seed=seed)
+        generation_seconds = time.perf_counter() - start
+
+        # hold back the newest rounds for the incremental scenario
+        os.makedirs(f"{source}/new")
+        for round in range(n_rounds + 1, n_rounds + n_new + 1):
+            shutil.move(f"{source}/data/raw/round_{round}.csv", f"{source}/new")
+
+        runs = [run_scenarios(source, False) for _ in range(repeat)]
+        memory = run_scenarios(source, True) if trace_memory else None
+
+    scenarios: Dict[str, Dict[str, StageStats]] = {}
+    for scenario in runs[0]:
+        scenarios[scenario] = {}
+        for stage in runs[0][scenario]:
+            scenarios[scenario][stage] = {
+                'seconds': min(run[scenario][stage]['seconds'] for run in runs),
+                'calls': runs[0][scenario][stage]['calls'],
+                'peak_bytes': memory[scenario][stage]['peak_bytes'] if memory else 0}
+
+    return {'config': config,
+            'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                            'pandas': pd.__version__, 'platform': platform.platform(),
+                            'cpus': os.cpu_count()},
+            'generation_seconds': generation_seconds,
+            'scenarios': scenarios}
+
+
+def find_regressions(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.25,
+                     min_seconds: float = 0.05, min_bytes: int = 1 << 20) -> List[str]:
+    """ Compare measurements with those of a baseline run.
+    Args:
+        results (Dict[str, Any]): Output of benchmark.
+        baseline (Dict[str, Any]): Output of an earlier benchmark run.
+        tolerance (float): Allowed relative increase of time and memory.
+        min_seconds (float): Absolute increase of time below which nothing is flagged.
+        min_bytes (int): Absolute increase of memory below which nothing is flagged.
+    Returns:
+        List[str]: Description of every regression.
+    """
+    regressions = []
+    for scenario, stages in results['scenarios'].items():
+        for stage, stats in stages.items():
+            base = baseline['scenarios'].get(scenario, {}).get(stage)
+            if base is None:
+                continue
+
+            for key, threshold, unit in [('seconds', min_seconds, 's'),
+                                         ('peak_bytes', min_bytes, ' B')]:
+                if (stats[key] > base[key] * (1 + tolerance)
+                        and stats[key] - base[key] > threshold and base[key] > 0):
+                    regressions.append(f"{scenario}/{stage}: {key} {base[key]:.4g}{unit} -> "
+                                       f"{stats[key]:.4g}{unit} "
+                                       f"(+{(stats[key] / base[key] - 1) * 100:.0f}%)")
+
+    return regressions
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    """ Print a table of all measurements.
+    Args:
+        results (Dict[str, Any]): Output of benchmark.
+    """
+    config = results['config']
+    print(f"{config['rounds']} rounds, {config['players']} players, "
+          f"{config['min_size']}-{config['max_size']} per round "
+          f"(generated in {results['generation_seconds']:.2f} s)")
+    for scenario, stages in results['scenarios'].items():
+        print(f"\n{scenario}")
+        for stage, stats in stages.items():
+            print(f"  {stage:<22} {stats['seconds']:9.4f} s {stats['calls']:6d} calls "
+                  f"{stats['peak_bytes'] / 2**20:9.1f} MiB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the analysis pipeline.')
+    parser.add_argument('--rounds', type=int, default=1000)
+    parser.add_argument('--players', type=int, default=300)
+    parser.add_argument('--min-size', type=int, default=8)
+    parser.add_argument('--max-size', type=int, default=16)
+    parser.add_argument('--new-rounds', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = benchmark(args.rounds, args.players, args.min_size, args.max_size,
+                        args.new_rounds, args.repeat, not args.no_memory, args.seed)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline['config'] != results['config']:
+            print('\nWarning: baseline was run with a different configuration.')
+        regressions = find_regressions(results, baseline, args.tolerance)
+        print(f"\n{len(regressions)} regressions (tolerance {args.tolerance:.0%})")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1 if regressions else 0)
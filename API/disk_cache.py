@@ -0,0 +1,109 @@
+import hashlib
+import os
+from pathlib import Path
+import tempfile
+from typing import List, Optional, Tuple
+
+
+class DiskCache:
+    """ Size-bounded least-recently-used cache of files in a directory, keyed by strings (e.g.
+        card names; the file names are hashes of the keys). A hit updates the modification
+        time of its file, so after a write that exceeds max_bytes the files used longest ago
+        are removed. Files are written atomically, so several processes can share a cache.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, suffix: str = ''):
+        """ Open (or create) the cache.
+        Args:
+            directory (Path): Directory of the cached files.
+            max_bytes (int): Maximum total size of the cached files.
+            suffix (str): File name suffix of the cached files (e.g. '.png').
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """ Find a cached file and mark it as recently used.
+        Args:
+            key (str): Key of the file.
+        Returns:
+            Optional[Path]: Path of the file, None if it is not cached.
+        """
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return path
+
+    def get(self, key: str) -> Optional[bytes]:
+        """ Content of a cached file (marked as recently used), None if it is not cached. """
+        path = self.lookup(key)
+        try:
+            return path.read_bytes() if path is not None else None
+        except FileNotFoundError:  # evicted meanwhile
+            return None
+
+    def put(self, key: str, content: bytes) -> Path:
+        """ Cache a file, then evict the least recently used ones if the cache is too large.
+        Args:
+            key (str): Key of the file.
+            content (bytes): Content of the file.
+        Returns:
+            Path: Path of the cached file.
+        """
+        path = self._path(key)
+        descriptor, temp_name = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(content)
+        os.replace(temp_name, path)
+
+        self._size += len(content)
+        if self._size > self.max_bytes:
+            self.evict(keep=path)
+
+        return path
+
+    def evict(self, keep: Optional[Path] = None) -> None:
+        """ Remove the least recently used files until the cache fits into max_bytes.
+        Args:
+            keep (Path): File that is never removed (the one just written).
+        """
+        entries = sorted(self._entries(), key=lambda e: e[0])
+        self._size = sum(size for _, size, _ in entries)
+
+        for _, size, entry in entries:
+            if self._size <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            try:
+                entry.unlink()
+            except FileNotFoundError:  # removed by another process
+                pass
+            self._size -= size
+
+    def _path(self, key: str) -> Path:
+        """ File of a key. """
+        return self.directory / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}{self.suffix}"
+
+    def _entries(self) -> List[Tuple[int, int, Path]]:
+        """ Modification time, size and path of all cached files (not the ones still being
+            written).
+        """
+        entries = []
+        for entry in self.directory.iterdir():
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:  # removed by another process
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry))
+
+        return entries
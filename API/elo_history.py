@@ -0,0 +1,65 @@
+import json
+import os
+from typing import Dict, List, Tuple, TypedDict
+
+import numpy as np
+from numpy.typing import NDArray
+
+# Elo history of all players, published next to the other artifacts: a raw little-endian
+# float64 matrix (one row per round, one column per player) and its index
+ELO_FILE = 'elo.bin'
+ELO_INDEX_FILE = 'elo_index.json'
+
+
+class EloIndex(TypedDict):
+    """ Index of the Elo matrix: players of the columns, rounds of the rows (0 for the state
+        before the first round) and shape of the matrix.
+    """
+    players: List[str]
+    rounds: List[int]
+    shape: List[int]
+    dtype: str
+
+
+def elo_artifacts(Elo: NDArray[np.float64], player_ids: Dict[str, int],
+                  rounds: List[int]) -> Tuple[bytes, EloIndex]:
+    """ Prepare the Elo matrix and its index for publishing.
+    Args:
+        Elo (NDArray[np.float64]): Elo scores of all players, shape (rounds+1, players)
+            (see analysis.compute_Elo_scores).
+        player_ids (Dict[str, int]): Column of every player.
+        rounds (List[int]): Numbers of the rounds, chronological.
+    Returns:
+        Tuple[bytes, EloIndex]: Content of ELO_FILE and ELO_INDEX_FILE.
+    """
+    matrix = np.ascontiguousarray(Elo, dtype='<f8')
+    players = sorted(player_ids, key=player_ids.get)  # type: ignore
+
+    return matrix.tobytes(), {'players': players, 'rounds': [0] + list(rounds),
+                              'shape': list(matrix.shape), 'dtype': '<f8'}
+
+
+def load_elo_history(data_dir: str = 'data') -> Tuple[NDArray[np.float64], EloIndex]:
+    """ Memory-map the published Elo matrix, so that series are read only when sliced.
+    Args:
+        data_dir (str): Directory with ELO_FILE and ELO_INDEX_FILE.
+    Returns:
+        Tuple[NDArray[np.float64], EloIndex]: Read-only matrix and its index.
+    """
+    with open(os.path.join(data_dir, ELO_INDEX_FILE), 'r', encoding='utf-8') as file:
+        index: EloIndex = json.load(file)
+
+    return map_elo_matrix(data_dir, index), index
+
+
+def map_elo_matrix(data_dir: str, index: EloIndex) -> NDArray[np.float64]:
+    """ Memory-map the published Elo matrix described by an index (e.g. one already loaded).
+    Args:
+        data_dir (str): Directory with ELO_FILE.
+        index (EloIndex): Index of the matrix.
+    Returns:
+        NDArray[np.float64]: Read-only matrix; raises ValueError if the file does not match
+            the shape of the index.
+    """
+    return np.memmap(os.path.join(data_dir, ELO_FILE), dtype=index['dtype'], mode='r',
+                     shape=tuple(index['shape']))
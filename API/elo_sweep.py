@@ -0,0 +1,106 @@
+""" Calibration of the Elo parameters (ELO_UPDATE_FACTOR and ELO_DIVISOR in analysis.py).
+
+Replays the history once for all combinations of update factor (K) and divisor at the same
+time (ratings of all combinations in one array, broadcast over a leading parameter axis). The
+expected score of every match, before it was played, is compared with its outcome (the score
+as used for the rating, e.g. 4-1 is 0.8): log-loss and Brier score, lower is better.
+
+Usage:
+    python elo_sweep.py [--k 4 8 16] [--divisor 400 512] [--burn-in 10] [--output sweep.csv]
+"""
+import argparse
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+
+from analysis import ELO_DIVISOR, ELO_START, ELO_UPDATE_FACTOR, load_rounds
+from history import as_history, History, round_results
+
+
+def sweep_Elo_parameters(data: Union[pd.DataFrame, History], update_factors: List[float],
+                         divisors: List[float], burn_in: int = 0) -> pd.DataFrame:
+    """ Evaluate the predictions of the Elo ratings for all combinations of parameters.
+    Args:
+        data (History or pd.DataFrame): Full history.
+        update_factors (List[float]): Values of the update factor (K).
+        divisors (List[float]): Values of the divisor of the rating difference.
+        burn_in (int): Number of rounds at the start that only update the ratings, without
+            counting their matches (everyone starts with the same rating).
+    Returns:
+        pd.DataFrame: 'update_factor', 'divisor', mean 'log_loss' and 'brier' score and
+            'n_matches' of every combination, best (lowest log-loss) first.
+    """
+    history = as_history(data)
+    K, D = np.meshgrid(np.asarray(update_factors, dtype=float), np.asarray(divisors, dtype=float),
+                       indexing='ij')
+    K, D = K.ravel(), D.ravel()
+
+    ratings = np.full((len(K), len(history['players'])), ELO_START)
+    log_loss = np.zeros(len(K))
+    brier = np.zeros(len(K))
+    n_matches = 0
+
+    for k in range(len(history['rounds'])):
+        ids = history['player_codes'][history['offsets'][k]:history['offsets'][k + 1]]
+        results = round_results(history, k).astype(float)
+        np.fill_diagonal(results, 1)
+        score = results / (results + results.T)
+
+        # a player listed twice in a round (round 107) always uses their first row / column
+        _, first_index, inverse = np.unique(ids, return_index=True, return_inverse=True)
+        score = score[np.ix_(first_index[inverse], first_index[inverse])]
+
+        # expected[c, p, o]: expected score of player p against opponent o for combination c
+        current = ratings[:, ids]
+        expected = 1 / (1 + np.float_power(10, (current[:, np.newaxis, :]
+                                                - current[:, :, np.newaxis])
+                                           / D[:, np.newaxis, np.newaxis]))
+
+        if k >= burn_in:  # every match once, not against themselves
+            i, j = np.triu_indices(len(ids), 1)
+            is_match = ids[i] != ids[j]
+            i, j = i[is_match], j[is_match]
+            predicted = np.clip(expected[:, i, j], 1e-12, 1 - 1e-12)
+            outcome = score[i, j]
+            log_loss -= (outcome * np.log(predicted)
+                         + (1 - outcome) * np.log(1 - predicted)).sum(axis=1)
+            brier += ((predicted - outcome)**2).sum(axis=1)
+            n_matches += len(i)
+
+        # updates of all rows of a player add up
+        update = K[:, np.newaxis] * (score - expected).sum(axis=2)
+        ratings[:, ids[first_index]] += update @ (inverse[:, np.newaxis]
+                                                  == np.arange(len(first_index)))
+
+    return (pd.DataFrame({'update_factor': K, 'divisor': D,
+                          'log_loss': log_loss / max(n_matches, 1),
+                          'brier': brier / max(n_matches, 1),
+                          'n_matches': n_matches})
+            .sort_values(['log_loss', 'brier'], kind='stable')
+            .reset_index(drop=True))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evaluate Elo parameters on the history.')
+    parser.add_argument('--k', type=float, nargs='+', default=np.arange(2, 42, 2).tolist(),
+                        help='update factors to evaluate')
+    parser.add_argument('--divisor', type=float, nargs='+',
+                        default=np.arange(200, 1040, 40).tolist(), help='divisors to evaluate')
+    parser.add_argument('--burn-in', type=int, default=10)
+    parser.add_argument('--output', help='write the full table to this csv file')
+    args = parser.parse_args()
+
+    # always include the current parameters, for comparison
+    sweep = sweep_Elo_parameters(load_rounds()[0], sorted(set(args.k) | {ELO_UPDATE_FACTOR}),
+                                 sorted(set(args.divisor) | {ELO_DIVISOR}), args.burn_in)
+
+    print(f"{len(sweep)} combinations, {sweep['n_matches'].iloc[0]} matches\n")
+    print(sweep.head(10).to_string())
+    current = sweep.loc[(sweep['update_factor'] == ELO_UPDATE_FACTOR)
+                        & (sweep['divisor'] == ELO_DIVISOR)]
+    print(f"\ncurrent parameters (rank {current.index[0] + 1}):")
+    print(current.to_string())
+
+    if args.output:
+        sweep.to_csv(args.output, index=False)
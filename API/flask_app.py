@@ -1,13 +1,23 @@
+from bisect import bisect_left, bisect_right
+from collections import Counter
 from io import BytesIO
 import json
 import logging
-
-from flask import Blueprint, Flask, jsonify, make_response, request, send_file, redirect, Response
+import time
+
+from badge_image import (ART_CACHE_BYTES, ART_CACHE_DIR, BADGE_CACHE_BYTES, BADGE_CACHE_DIR,
+                         badge_card, badge_key, cache_dir, CardArt, load_font,
+                         PRERENDERED_INDEX, render_badge, ScryfallFetcher)
+from disk_cache import DiskCache
+from elo_history import ELO_INDEX_FILE, map_elo_matrix
+from flask import Flask, g, jsonify, make_response, request, send_file, Response
 from flask_cors import cross_origin
+from flask.logging import default_handler
+from key_store import KeyStore
 from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont
 from proxy import reverse_proxy
-import requests
+from queue_logging import start_queue_logging
+from response_cache import ResponseCache
 
 app = Flask(__name__)
 BASE_DIR = Path(__file__).resolve().parent
@@ -17,12 +27,43 @@ DATA_DIR = BASE_DIR / 'data'
 ORIGIN = '*'
 header_keys = ['Content-Type', 'user-name', 'x-api-key']
 
-# logger settings
+# logger settings: requests only enqueue their records, a background thread writes them to
+# app.log in batches (see queue_logging.py)
 handler = logging.FileHandler('app.log')
 handler.setLevel(logging.INFO)
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
-app.logger.addHandler(handler)
+app.logger.setLevel(logging.INFO)
+default_handler.setLevel(logging.WARNING)  # the console only shows problems, as before
+log_listener = start_queue_logging(app.logger, handler)
+# one structured (JSON) record per request
+access_logger = app.logger.getChild('access')
+
+@app.before_request
+def start_timer():
+    """Remember when the request started, for the access record."""
+    g.start_time = time.perf_counter()
+
+@app.after_request
+def log_access(response):
+    """Log endpoint, user, status, size and latency of the request.
+    Args:
+        response (response): Response to the request.
+    Returns:
+        (response): The unchanged response.
+    """
+    access_logger.info(json.dumps({
+        'endpoint': request.endpoint,
+        'path': request.path,
+        'user': request.headers.get('user-name'),
+        'status': response.status_code,
+        'bytes': response.content_length,  # None for streamed responses
+        'ms': round(1000 * (time.perf_counter() - g.start_time), 3)}, ensure_ascii=False))
+
+    return response
+
+# hashed API keys of all users, reloaded when api_keys.json changes
+API_KEYS = KeyStore(logger=app.logger)
 
 def check_api_key(headers):
     """Try to autheticate the user with their API key.
@@ -35,17 +76,54 @@ def check_api_key(headers):
         app.logger.info('Login failed due to missing username / API key.')
         return False
 
-    with open('api_keys.json', 'r', encoding='utf-8') as file:
-        api_keys = json.load(file)
-
-    if headers.get('x-api-key') in api_keys[headers.get('user-name')]:
-        app.logger.info('Login in for user %s failed with incorrect API key.',
-                        headers.get('user-name'))
+    if API_KEYS.verify(headers.get('user-name'), headers.get('x-api-key')):
+        app.logger.info('Login for user %s successful.', headers.get('user-name'))
         return True
 
-    app.logger.info('Login for user %s successful.', headers.get('user-name'))
+    app.logger.info('Login for user %s failed with incorrect API key.', headers.get('user-name'))
     return False
 
+# how long browsers may use a response before revalidating it (seconds), by endpoint; the
+# responses are private, since they are only served with an API key
+MAX_AGE = {'hall_of_fame': 300,
+           'banned_list': 3600,
+           'players_rounds_lists': 300,
+           'round_details': 3600,
+           'player_stats': 300,
+           'popular_cards': 300}
+
+# all JSON artifacts (and their precompressed variants), served without touching the disk
+RESPONSES = ResponseCache(DATA_DIR, logger=app.logger)
+# content encodings of the precompressed variants, preferred first
+ENCODINGS = ['br', 'gzip']
+
+def cached_json(path):
+    """Build the response for a published artifact from the response cache, with its ETag and
+    the caching headers of the endpoint (304 Not Modified if the client has it already). The
+    best precompressed variant the client accepts is sent, if there is one.
+    Args:
+        path (str): Path of the artifact relative to DATA_DIR.
+    Returns:
+        (response): JSON response, None if there is no such artifact.
+    """
+    artifact = RESPONSES.get(path)
+    if artifact is None:
+        return None
+
+    encoding = request.accept_encodings.best_match(
+        [encoding for encoding in ENCODINGS if encoding in artifact], default='identity')
+    variant = artifact[encoding]
+
+    response = Response(variant['body'], 200, mimetype=app.json.mimetype)
+    if encoding != 'identity':
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(variant['etag'])
+    response.cache_control.private = True
+    response.cache_control.max_age = MAX_AGE.get(request.endpoint, 0)
+
+    return response.make_conditional(request)
+
 @app.route('/hall_of_fame')
 @cross_origin(origin=ORIGIN, headers=header_keys)
 def hall_of_fame():
@@ -58,13 +136,13 @@ def hall_of_fame():
 
     app.logger.info('Get %s request from %s.', request.endpoint, request.headers.get('user-name'))
 
-    try:
-        with open(DATA_DIR / 'hall_of_fame.json', 'r', encoding='utf-8') as file:
-            return jsonify(json.load(file)), 200
-    except FileNotFoundError:
+    response = cached_json('hall_of_fame.json')
+    if response is None:
         app.logger.warning('Get Hall of Fame failed!')
         return make_response('An error occurred.', 404)
 
+    return response
+
 @app.route('/banned_list')
 @cross_origin(origin=ORIGIN, headers=header_keys)
 def banned_list():
@@ -77,13 +155,13 @@ def banned_list():
 
     app.logger.info('Get %s request from %s.', request.endpoint, request.headers.get('user-name'))
 
-    try:
-        with open(DATA_DIR / 'banned_list.json', 'r', encoding='utf-8') as file:
-            return jsonify(json.load(file)), 200
-    except FileNotFoundError:
+    response = cached_json('banned_list.json')
+    if response is None:
         app.logger.warning('Get banned list failed!')
         return make_response('An error occurred.', 404)
 
+    return response
+
 @app.route('/players_rounds_lists')
 @cross_origin(origin=ORIGIN, headers=header_keys)
 def players_rounds_lists():
@@ -96,13 +174,13 @@ def players_rounds_lists():
 
     app.logger.info('Get %s request from %s.', request.endpoint, request.headers.get('user-name'))
 
-    try:
-        with open(DATA_DIR / 'players_rounds_lists.json', 'r', encoding='utf-8') as file:
-            return jsonify(json.load(file)), 200
-    except FileNotFoundError:
+    response = cached_json('players_rounds_lists.json')
+    if response is None:
         app.logger.warning('Get players and rounds lists failed!')
         return make_response('An error occurred.', 404)
 
+    return response
+
 @app.route('/round/<int:number>')
 @cross_origin(origin=ORIGIN, headers=header_keys)
 def round_details(number):
@@ -117,13 +195,13 @@ def round_details(number):
 
     app.logger.info('Get %s request from %s.', request.endpoint, request.headers.get('user-name'))
 
-    try:
-        with open(DATA_DIR / f"rounds/{number}.json", 'r', encoding='utf-8') as file:
-            return jsonify(json.load(file)), 200
-    except FileNotFoundError:
+    response = cached_json(f"rounds/{number}.json")
+    if response is None:
         app.logger.warning('Get details for round %i failed!', number)
         return make_response('Invalid round number.', 404)
 
+    return response
+
 @app.route('/playerstats/<player>')
 @cross_origin(origin=ORIGIN, headers=header_keys)
 def player_stats(player):
@@ -138,13 +216,13 @@ def player_stats(player):
 
     app.logger.info('Get %s request from %s.', request.endpoint, request.headers.get('user-name'))
 
-    try:
-        with open(DATA_DIR / f"players/{player}.json", 'r', encoding='utf-8') as file:
-            return jsonify(json.load(file)), 200
-    except FileNotFoundError:
-        app.logger.warning('Get details for round %s failed!', player)
+    response = cached_json(f"players/{player}.json")
+    if response is None:
+        app.logger.warning('Get details for player %s failed!', player)
         return make_response('Player not found.', 404)
 
+    return response
+
 @app.route('/popular_cards')
 @cross_origin(origin=ORIGIN, headers=header_keys)
 def popular_cards():
@@ -157,73 +235,192 @@ def popular_cards():
 
     app.logger.info('Get %s request from %s.', request.endpoint, request.headers.get('user-name'))
 
-    try:
-        with open(DATA_DIR / 'popular_cards.json', 'r', encoding='utf-8') as file:
-            return jsonify(json.load(file)), 200
-    except FileNotFoundError:
+    response = cached_json('popular_cards.json')
+    if response is None:
         app.logger.warning('Get popular cards list failed!')
         return make_response('An error occurred.', 404)
 
-def get_card_image(card_name):
-    # get list of prints
-    response = requests.get(f"https://api.scryfall.com/cards/named?exact={card_name}", stream=True)
-    if response.status_code == 200:
-        prints_uri = response.json()['prints_search_uri']
+    return response
 
-    # get image of oldest print
-    response = requests.get(prints_uri, stream=True)
-    if response.status_code == 200:
-        img_uri = response.json()['data'][-1]['image_uris']['art_crop']
+def card_lookup(card_index):
+    """Case-insensitive lookup of the cards of the card index (see analysis.py), built once per
+    version of card_index.json (see ResponseCache.get_view).
+    Args:
+        card_index (dict): Postings of every card.
+    Returns:
+        (tuple): The card index and the names of its cards by lower case name.
+    """
+    return card_index, {name.lower(): name for name in card_index}
 
-    response = requests.get(img_uri, stream=True)
-    if response.status_code == 200:
-        return Image.open(BytesIO(response.content))
+@app.route('/card/<path:name>', merge_slashes=False)  # e.g. "Hypnotic Sprite // Mesmeric Glare"
+@cross_origin(origin=ORIGIN, headers=header_keys)
+def card_usage(name):
+    """Get the usage of a single card: every deck it was played in, by whom and with which result.
+    Args:
+        name (str): Name of the card (case-insensitive).
+    Returns:
+        (response): JSON data with aggregate results, timeline and players of the card.
+    """
+    if not check_api_key(request.headers):
+        return make_response('Unauthorized access', 401)
 
-@app.route('/badge/<player>.png')
-@cross_origin(origin=ORIGIN, headers='Content-Type')
-def badge(player: str):
-    """ Create a badge to use on social media for the player.
+    app.logger.info('Get %s request from %s.', request.endpoint, request.headers.get('user-name'))
+
+    card_index, card_names = RESPONSES.get_view('card_index.json', card_lookup) or ({}, {})
+    card = card_names.get(name.lower())
+    if card is None:
+        app.logger.warning('Get usage of card %s failed!', name)
+        return make_response('Card not found.', 404)
+
+    postings = card_index[card]
+    timeline = [{'round': r, 'player': p, 'index': i, 'points': pts, 'place': pl}
+                for r, p, i, pts, pl in zip(postings['round'], postings['player'],
+                                            postings['index'], postings['points'],
+                                            postings['place'])]
+    players = [{'player': p, 'count': n} for p, n in
+               sorted(Counter(postings['player']).items(), key=lambda pn: (-pn[1], pn[0]))]
+
+    return jsonify({'card': card,
+                    'n_played': len(timeline),
+                    'n_rounds': len(set(postings['round'])),
+                    'n_players': len(players),
+                    'wins': sum(place == 1 for place in postings['place']),
+                    'points_average': sum(postings['points']) / len(timeline),
+                    'timeline': timeline,
+                    'players': players}), 200
+
+def elo_lookup(elo_index):
+    """Memory-map the Elo history of all players (see elo_history.py), once per version of
+    elo_index.json (see ResponseCache.get_view).
     Args:
-        player (str): Name of the player.
+        elo_index (dict): Index of the Elo matrix.
     Returns:
-        (file): Badge image.
+        (tuple): Elo matrix (rounds x players), its index and the column of every player, None
+            for all if the matrix does not match the index.
     """
-    with open(DATA_DIR / 'players_rounds_lists.json', 'r', encoding='utf-8') as file:
-        player_list = json.load(file)['player_names']
+    try:
+        matrix = map_elo_matrix(DATA_DIR, elo_index)
+    except (OSError, ValueError):
+        app.logger.warning('Loading Elo history failed!')
+        return None, None, None
 
-    if player not in player_list:
-        return make_response('Player does not exist', 404)
+    return matrix, elo_index, {player: i for i, player in enumerate(elo_index['players'])}
+
+@app.route('/elo')
+@cross_origin(origin=ORIGIN, headers=header_keys)
+def elo_series():
+    """Get the Elo history of selected players in a range of rounds, e.g.
+    /elo?player=A&player=B&from=100&to=150 (from and to are optional and inclusive).
+    Returns:
+        (response): JSON data with the round numbers (0 for the initial rating) and the Elo
+            series of every player.
+    """
+    if not check_api_key(request.headers):
+        return make_response('Unauthorized access', 401)
 
-    image = Image.new('RGB', (600, 125), color='#888')
-    draw = ImageDraw.Draw(image)
+    app.logger.info('Get %s request from %s.', request.endpoint, request.headers.get('user-name'))
 
-    with open(DATA_DIR / f"players/{player}.json", 'r', encoding='utf-8') as file:
-        top3_cards = [entry['card'] for entry in json.load(file)['cards'][:3]]
+    players = request.args.getlist('player')
+    if not players:
+        return make_response('No player given.', 400)
+    elo, elo_index, elo_columns = RESPONSES.get_view(ELO_INDEX_FILE, elo_lookup) or (None,) * 3
+    if elo is None or any(player not in elo_columns for player in players):
+        app.logger.warning('Get Elo history for %s failed!', players)
+        return make_response('Player not found.', 404)
 
-    fetched_image = get_card_image(top3_cards[0])
-    fetched_image.thumbnail((100, 100))  # Resize if needed (max sizes)
-    image.paste(fetched_image, (180, 10))  # Paste onto the badge
+    rounds = elo_index['rounds']
+    first = bisect_left(rounds, request.args.get('from', rounds[0], type=int))
+    last = bisect_right(rounds, request.args.get('to', rounds[-1], type=int))
+    series = elo[first:last, [elo_columns[player] for player in players]]
 
-    # Load a font (make sure to have a .ttf file in your directory or use a default one)
-    try:
-        font = ImageFont.truetype('arial.ttf', 16)
-    except IOError:
-        font = ImageFont.load_default()
+    return jsonify({'rounds': rounds[first:last],
+                    'elo': {player: series[:, i].tolist() for i, player in enumerate(players)}
+                    }), 200
+
+# maximum number of players and rounds in one batch request
+MAX_BATCH_ITEMS = 100
+
+@app.route('/batch')
+@cross_origin(origin=ORIGIN, headers=header_keys)
+def batch():
+    """Get the details of several players and rounds at once, e.g.
+    /batch?player=A&player=B&round=140&round=141 (repeated parameters, since player names may
+    contain commas).
+    Returns:
+        (response): One JSON document, streamed: the data of every found player and round (as
+            from /playerstats and /round) and the requested ones that were not found.
+    """
+    if not check_api_key(request.headers):
+        return make_response('Unauthorized access', 401)
 
-    # Draw badge information
-    draw.text((10, 10), f"Badge: {player}", font=font, fill="black")
-    draw.text((10, 40), f"some other text", font=font, fill="black")
+    app.logger.info('Get %s request from %s.', request.endpoint, request.headers.get('user-name'))
+
+    players = list(dict.fromkeys(request.args.getlist('player')))
+    rounds = list(dict.fromkeys(request.args.getlist('round', type=int)))
+    if not players and not rounds:
+        return make_response('No player or round given.', 400)
+    if len(players) + len(rounds) > MAX_BATCH_ITEMS:
+        return make_response(f"At most {MAX_BATCH_ITEMS} players and rounds per request.", 400)
+
+    # look everything up before streaming, so the document is from one version of the data
+    artifacts = {
+        'players': {player: RESPONSES.get(f"players/{player}.json") for player in players},
+        'rounds': {str(number): RESPONSES.get(f"rounds/{number}.json") for number in rounds}}
+    found = {section: [(key, artifact) for key, artifact in items.items() if artifact]
+             for section, items in artifacts.items()}
+    missing = {'players': [player for player in players if not artifacts['players'][player]],
+               'rounds': [number for number in rounds if not artifacts['rounds'][str(number)]]}
+
+    def generate():
+        yield b'{'
+        for section, items in found.items():
+            yield f"{json.dumps(section)}:{{".encode('utf-8')
+            for i, (key, artifact) in enumerate(items):
+                yield f"{',' if i else ''}{json.dumps(key, ensure_ascii=False)}:".encode('utf-8')
+                yield artifact['identity']['body']
+            yield b'},'
+        yield f"\"missing\":{json.dumps(missing, ensure_ascii=False)}}}\n".encode('utf-8')
+
+    return Response(generate(), 200, mimetype=app.json.mimetype)
+
+# card art (by card name) and rendered badges (by player data), kept on disk between requests
+# (below IMAGE_CACHE_ROOT, see badge_image)
+CARD_ART = CardArt(ScryfallFetcher(),
+                   DiskCache(cache_dir(DATA_DIR, ART_CACHE_DIR), ART_CACHE_BYTES))
+BADGES = DiskCache(cache_dir(DATA_DIR, BADGE_CACHE_DIR), BADGE_CACHE_BYTES, suffix='.png')
+BADGE_FONT = load_font()
+
+@app.route('/badge/<player>.png')
+@cross_origin(origin=ORIGIN, headers='Content-Type')
+def badge(player: str):
+    """ Create a badge to use on social media for the player. The pre-rendered badge is sent
+    if it is up to date (see prerender_badges.py), otherwise badges are rendered once per
+    version of the player's data, repeated requests send the cached file.
+    Args:
+        player (str): Name of the player.
+    Returns:
+        (file): Badge image.
+    """
+    artifact = RESPONSES.get(f"players/{player}.json")
+    if artifact is None:
+        return make_response('Player does not exist', 404)
 
-    # Optionally, add a badge image if you have a specific one
-    # badge_image = Image.open(requests.get(badge['image_url'], stream=True).raw)
-    # image.paste(badge_image, (180, 50))
+    key = badge_key(player, artifact['identity']['etag'])
+    prerendered = (RESPONSES.get_json(PRERENDERED_INDEX) or {}).get(player)
+    if prerendered is not None and prerendered['key'] == key:
+        return send_file(DATA_DIR / prerendered['file'], mimetype='image/png')
 
-    # Convert image to byte stream and return as response
-    byte_io = BytesIO()
-    image.save(byte_io, 'PNG')
-    byte_io.seek(0)
+    path = BADGES.lookup(key)
+    if path is None:
+        card = badge_card(RESPONSES.get_json(f"players/{player}.json"))
+        art = CARD_ART.get(card) if card is not None else None
+        image = render_badge(player, art, BADGE_FONT)
+        if card is not None and art is None:  # not cached, the art may be available later
+            app.logger.warning('Get art of card %s failed!', card)
+            return send_file(BytesIO(image), mimetype='image/png')
+        path = BADGES.put(key, image)
 
-    return send_file(byte_io, mimetype='image/png')
+    return send_file(path, mimetype='image/png')
 
 @app.route('/badge_embedding/<player>')
 @cross_origin(origin=ORIGIN, headers='Content-Type')
@@ -237,46 +434,7 @@ def badge_embedding(player: str):
     embed_code = f'<img src="{request.host_url}badge/{player}.png" alt="3CB_stats info badge">'
     return jsonify({'embed_code': embed_code}), 200
 
-# Mount Streamlit under /dashboard
-reverse_proxy = Blueprint("reverse_proxy", __name__)
-
-STREAMLIT_URL = "http://127.0.0.1:8501"
-
-@app.route("/dashboard")
-def dashboard_redirect():
-    return redirect("/dashboard/", code=302)
-
-@reverse_proxy.route("/dashboard/", defaults={"path": ""})
-@reverse_proxy.route("/dashboard/<path:path>")
-def dashboard_proxy(path):
-    # Build the full Streamlit URL including baseUrlPath
-    target_url = f"{STREAMLIT_URL}/dashboard/{path}"
-
-    resp = requests.request(
-        method=request.method,
-        url=target_url,
-        headers={k: v for k, v in request.headers if k.lower() != "host"},
-        data=request.get_data(),
-        cookies=request.cookies,
-        allow_redirects=False,
-        stream=True,
-    )
-
-    excluded_headers = {
-        "content-encoding",
-        "content-length",
-        "transfer-encoding",
-        "connection",
-    }
-
-    headers = [
-        (name, value)
-        for name, value in resp.raw.headers.items()
-        if name.lower() not in excluded_headers
-    ]
-
-    return Response(resp.content, resp.status_code, headers)
-
+# Streamlit dashboard under /dashboard (see proxy.py)
 app.register_blueprint(reverse_proxy)
 
 if __name__ == '__main__':
@@ -0,0 +1,298 @@
+from io import BytesIO
+from typing import Any, Dict, List, Tuple, TypedDict, Union
+import zipfile
+
+import numpy as np
+from numpy.typing import NDArray
+import pandas as pd
+
+
+class BaseHistory(TypedDict):
+    """ Compact round history. Rows (a player in a round) are sorted by round, within a round
+        in the order of its results table. The results of all rounds are square matrices in
+        one flat int8 buffer (a ragged array): round k (number rounds[k]) has the rows
+        offsets[k]:offsets[k+1] and the results result_offsets[k]:result_offsets[k+1], row by
+        row. Player and card names are stored once, rows refer to them by their codes; decks
+        are rows of card codes (-1 for no card).
+    """
+    rounds: NDArray[np.int64]
+    offsets: NDArray[np.int64]
+    result_offsets: NDArray[np.int64]
+    results: NDArray[np.int8]
+    players: NDArray[np.object_]
+    player_codes: NDArray[np.int32]
+    cards: NDArray[np.object_]
+    card_codes: NDArray[np.int32]
+    bonus: NDArray[np.int16]
+
+
+class History(BaseHistory, total=False):
+    """ History with the derived columns of every row (see analysis.add_derivates_to_round).
+    """
+    sum: NDArray[np.int32]
+    percent: NDArray[np.float64]
+    place: NDArray[np.int32]
+
+
+# derived History fields and their DataFrame columns
+DERIVED_COLUMNS = {'sum': 'sum', 'percent': '%', 'place': 'place'}
+
+
+def history_from_rounds(round_dfs: List[pd.DataFrame]) -> History:
+    """ Build the compact history from the tables of single rounds (as read from the raw
+        files, with complete results).
+    Args:
+        round_dfs (List[pd.DataFrame]): One table per round, with 'player', 'card_*',
+            'result_*' and 'round' columns ('bonus' and derived columns are optional).
+    Returns:
+        History: All rounds, sorted by round number.
+    """
+    round_dfs = sorted(round_dfs, key=lambda d: int(d['round'].iloc[0]))
+    sizes = np.array([len(d) for d in round_dfs], dtype=np.int64)
+    card_cols = sorted({c for d in round_dfs for c in d.columns if c.startswith('card_')},
+                       key=lambda x: int(x.split('_')[1]))
+
+    def stack(values: List[NDArray], dtype: type, shape: Tuple[int, ...] = (0,)) -> NDArray:
+        return np.concatenate(values).astype(dtype) if values else np.zeros(shape, dtype)
+
+    player_codes, players = pd.factorize(stack([d['player'].to_numpy(dtype=object)
+                                                for d in round_dfs], object))
+    decks = stack([d.reindex(columns=card_cols).to_numpy(dtype=object) for d in round_dfs],
+                 object, (0, len(card_cols)))
+    cards = pd.unique(decks.ravel())
+    vocabulary = sorted(cards[pd.notna(cards)])
+
+    history: History = {
+        'rounds': np.array([int(d['round'].iloc[0]) for d in round_dfs], dtype=np.int64),
+        'offsets': np.concatenate([[0], np.cumsum(sizes)]),
+        'result_offsets': np.concatenate([[0], np.cumsum(sizes**2)]),
+        'results': stack([d[[f"result_{i}" for i in range(len(d))]].to_numpy().ravel()
+                         for d in round_dfs], np.int8),
+        'players': np.asarray(players, dtype=object),
+        'player_codes': player_codes.astype(np.int32),
+        'cards': np.array(vocabulary, dtype=object),
+        'card_codes': pd.Categorical(decks.ravel(), categories=vocabulary).codes.reshape(
+            decks.shape).astype(np.int32),
+        'bonus': stack([d['bonus'].fillna(0).to_numpy() if 'bonus' in d.columns
+                       else np.zeros(len(d)) for d in round_dfs], np.int16)}
+
+    for key, column in DERIVED_COLUMNS.items():
+        if round_dfs and all(column in d.columns for d in round_dfs):
+            history[key] = stack([d[column].to_numpy() for d in round_dfs],  # type: ignore
+                                 np.float64 if key == 'percent' else np.int32)
+
+    return history
+
+
+def history_from_frame(df: pd.DataFrame) -> History:
+    """ Build the compact history from a (wide, NaN-padded) DataFrame of rounds.
+    Args:
+        df (pd.DataFrame): Rounds with complete results, rows of a round in the order of
+            their 'result_*' columns.
+    Returns:
+        History: All rounds, sorted by round number.
+    """
+    return history_from_rounds([round_df for _, round_df in df.groupby('round', sort=True)])
+
+
+def history_frame(history: History, with_results: bool = False) -> pd.DataFrame:
+    """ Table with one row per player and round, e.g. for grouping by player.
+    Args:
+        history (History): Compact history.
+        with_results (bool): Add the 'result_*' columns (as wide as the largest round, padded
+            with NaN), as in the raw data.
+    Returns:
+        pd.DataFrame: 'player', 'card_*' (categoricals sharing the card vocabulary),
+            ('result_*'), 'round', 'bonus' and the derived columns.
+    """
+    frame = pd.DataFrame({'player': history['players'][history['player_codes']]})
+
+    vocabulary = pd.CategoricalDtype(history['cards'])
+    for c in range(history['card_codes'].shape[1]):
+        frame[f"card_{c + 1}"] = pd.Categorical.from_codes(history['card_codes'][:, c],
+                                                           dtype=vocabulary)
+
+    if with_results:
+        rows, columns = result_positions(history)
+        results = np.full((len(frame), round_sizes(history).max(initial=0)), np.nan)
+        results[rows, columns] = history['results']
+        for i in range(results.shape[1]):
+            frame[f"result_{i}"] = results[:, i]
+
+    frame['round'] = np.repeat(history['rounds'], round_sizes(history))
+    frame['bonus'] = history['bonus']
+    for key, column in DERIVED_COLUMNS.items():
+        if key in history:
+            frame[column] = history[key]  # type: ignore
+
+    return frame
+
+
+def as_history(data: Union[pd.DataFrame, History]) -> History:
+    """ Accept both representations: DataFrames are converted to the compact history. """
+    return history_from_frame(data) if isinstance(data, pd.DataFrame) else data
+
+
+def as_frame(data: Union[pd.DataFrame, History]) -> pd.DataFrame:
+    """ Accept both representations: histories are converted to a table (without results). """
+    return data if isinstance(data, pd.DataFrame) else history_frame(data)
+
+
+def round_sizes(history: History) -> NDArray[np.int64]:
+    """ Number of players in every round. """
+    return np.diff(history['offsets'])
+
+
+def round_results(history: History, k: int) -> NDArray[np.int8]:
+    """ Results table of the k-th round (a view into the flat buffer, no copy). """
+    size = history['offsets'][k + 1] - history['offsets'][k]
+    return history['results'][history['result_offsets'][k]:
+                              history['result_offsets'][k + 1]].reshape(size, size)
+
+
+def result_positions(history: History) -> Tuple[NDArray[np.int64], NDArray[np.int64]]:
+    """ Row (in the history) and column (position of the opponent in the round) of every
+        entry of the results buffer.
+    """
+    sizes = round_sizes(history)
+    row_sizes = np.repeat(sizes, sizes)
+    rows = np.repeat(np.arange(len(row_sizes)), row_sizes)
+    columns = np.arange(len(rows)) - np.repeat(np.cumsum(row_sizes) - row_sizes, row_sizes)
+
+    return rows, columns
+
+
+def row_positions(history: History) -> NDArray[np.int64]:
+    """ Position of every row within its round. """
+    sizes = round_sizes(history)
+    return np.arange(history['offsets'][-1]) - np.repeat(history['offsets'][:-1], sizes)
+
+
+def history_players(history: History) -> List[str]:
+    """ Names of the players in the history, in the order of their first round. """
+    return history['players'][pd.unique(history['player_codes'])].tolist()
+
+
+def concat_ranges(starts: NDArray[np.int64], lengths: NDArray[np.int64]) -> NDArray[np.int64]:
+    """ Indices of several ranges (start, start+1, ..., start+length-1) concatenated. """
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+
+def select_rounds(history: History, round_numbers: List[int]) -> History:
+    """ Copy of the history with only the given rounds (player and card vocabularies are kept).
+    Args:
+        history (History): Compact history.
+        round_numbers (List[int]): Numbers of the rounds to keep (missing ones are ignored).
+    Returns:
+        History: The selected rounds.
+    """
+    keep = np.flatnonzero(np.isin(history['rounds'], round_numbers))
+    sizes = round_sizes(history)[keep]
+    rows = concat_ranges(history['offsets'][keep], sizes)
+    entries = concat_ranges(history['result_offsets'][keep], sizes**2)
+
+    selected: History = {'rounds': history['rounds'][keep],
+                         'offsets': np.concatenate([[0], np.cumsum(sizes)]),
+                         'result_offsets': np.concatenate([[0], np.cumsum(sizes**2)]),
+                         'results': history['results'][entries],
+                         'players': history['players'],
+                         'player_codes': history['player_codes'][rows],
+                         'cards': history['cards'],
+                         'card_codes': history['card_codes'][rows],
+                         'bonus': history['bonus'][rows]}
+    for key in DERIVED_COLUMNS:
+        if key in history:
+            selected[key] = history[key][rows]  # type: ignore
+
+    return selected
+
+
+def replace_rounds(history: History, new: History, removed: List[int]) -> History:
+    """ Update a history without rebuilding it: the given rounds and those of new are
+        removed, then the rounds of new are inserted. Unchanged rounds are copied as a few
+        contiguous blocks, the vocabularies are rebuilt as history_from_rounds would.
+    Args:
+        history (History): Previous history, with derived columns.
+        new (History): Added or changed rounds, with derived columns.
+        removed (List[int]): Numbers of further rounds to remove (e.g. deleted raw files).
+    Returns:
+        History: All rounds, sorted by round number.
+    """
+    keep = np.flatnonzero(~np.isin(history['rounds'], np.concatenate([removed, new['rounds']])))
+    sources = np.concatenate([np.zeros(len(keep), dtype=int), np.ones(len(new['rounds']), int)])
+    indices = np.concatenate([keep, np.arange(len(new['rounds']))])
+    order = np.argsort(np.concatenate([history['rounds'][keep], new['rounds']]), kind='stable')
+    sources, indices = sources[order], indices[order]
+
+    # player and card codes of both histories in merged vocabularies
+    players = pd.unique(np.concatenate([history['players'], new['players']]))
+    cards = np.array(sorted(set(history['cards']) | set(new['cards'])), dtype=object)
+    width = max(history['card_codes'].shape[1], new['card_codes'].shape[1])
+    parts = []
+    for part in (history, new):
+        player_map = pd.Index(players).get_indexer(part['players'])
+        card_map = np.append(np.searchsorted(cards, part['cards']), -1)  # -1: no card
+        card_codes = np.full((len(part['card_codes']), width), -1, dtype=np.int32)
+        card_codes[:, :part['card_codes'].shape[1]] = card_map[part['card_codes']]
+        parts.append({**part, 'player_codes': player_map[part['player_codes']],
+                      'card_codes': card_codes})
+
+    # runs of consecutive rounds of the same source, each copied as one block
+    starts = np.flatnonzero((np.diff(sources, prepend=-1) != 0)
+                            | (np.diff(indices, prepend=-2) != 1))
+    ends = np.append(starts[1:], len(sources))
+    blocks: Dict[str, List[NDArray]] = {}
+    for start, end in zip(starts, ends):
+        part = parts[sources[start]]
+        first, last = indices[start], indices[end - 1] + 1
+        rows = slice(part['offsets'][first], part['offsets'][last])
+        for key in ['player_codes', 'card_codes', 'bonus', *DERIVED_COLUMNS]:
+            blocks.setdefault(key, []).append(part[key][rows])
+        blocks.setdefault('results', []).append(
+            part['results'][part['result_offsets'][first]:part['result_offsets'][last]])
+        blocks.setdefault('rounds', []).append(part['rounds'][first:last])
+        blocks.setdefault('sizes', []).append(np.diff(part['offsets'][first:last + 1]))
+
+    if not blocks:
+        return select_rounds(history, [])
+
+    sizes = np.concatenate(blocks['sizes'])
+    player_codes, used_players = pd.factorize(np.concatenate(blocks['player_codes']))
+    card_codes = np.concatenate(blocks['card_codes'])
+    used_cards = np.unique(card_codes[card_codes >= 0])
+    card_map = np.full(len(cards) + 1, -1, dtype=np.int32)  # last entry: no card
+    card_map[used_cards] = np.arange(len(used_cards))
+
+    merged: History = {'rounds': np.concatenate(blocks['rounds']),
+                       'offsets': np.concatenate([[0], np.cumsum(sizes)]),
+                       'result_offsets': np.concatenate([[0], np.cumsum(sizes**2)]),
+                       'results': np.concatenate(blocks['results']),
+                       'players': players[used_players],
+                       'player_codes': player_codes.astype(np.int32),
+                       'cards': cards[used_cards],
+                       'card_codes': card_map[card_codes],
+                       'bonus': np.concatenate(blocks['bonus'])}
+    for key in DERIVED_COLUMNS:
+        merged[key] = np.concatenate(blocks[key])  # type: ignore
+
+    return merged
+
+
+def npz_archive(arrays: Dict[str, NDArray[Any]]) -> bytes:
+    """ Compressed npz archive of arrays, like np.savez_compressed but without timestamps, so
+        that the same arrays always give the same bytes (and an unchanged archive is not
+        published again).
+    Args:
+        arrays (Dict[str, NDArray[Any]]): Arrays by name (read with np.load).
+    Returns:
+        bytes: Content of the archive.
+    """
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, array in arrays.items():
+            info = zipfile.ZipInfo(f"{name}.npy", date_time=(1980, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, 'w', force_zip64=True) as file:
+                np.lib.format.write_array(file, np.asanyarray(array), allow_pickle=False)
+
+    return buffer.getvalue()
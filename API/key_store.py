@@ -0,0 +1,128 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# API keys of all users (relative to the working directory of the server)
+KEY_FILE = 'api_keys.json'
+# keys are only stored as hashes; they are random tokens, so a plain (fast) hash suffices
+HASH_PREFIX = 'sha256:'
+
+
+def hash_key(key: str) -> str:
+    """ Hash an API key for storing and comparing.
+    Args:
+        key (str): API key as handed to the user.
+    Returns:
+        str: Stored form of the key (HASH_PREFIX and hex digest).
+    """
+    return f"{HASH_PREFIX}{hashlib.sha256(key.encode('utf-8')).hexdigest()}"
+
+
+def load_key_file(file_name: str = KEY_FILE) -> Dict[str, List[str]]:
+    """ Read the key file, hashing keys that are still stored in plain text.
+    Args:
+        file_name (str): Key file.
+    Returns:
+        Dict[str, List[str]]: Hashed keys of every user.
+    """
+    with open(file_name, 'r', encoding='utf-8') as file:
+        key_data = json.load(file)
+
+    return {user: [key if key.startswith(HASH_PREFIX) else hash_key(key) for key in keys]
+            for user, keys in key_data.items()}
+
+
+def save_key_file(key_data: Dict[str, List[str]], file_name: str = KEY_FILE) -> None:
+    """ Replace the key file atomically, so a server never reads a partial file.
+    Args:
+        key_data (Dict[str, List[str]]): Hashed keys of every user.
+        file_name (str): Key file.
+    """
+    with open(f"{file_name}.tmp", 'w', encoding='utf-8') as file:
+        json.dump(key_data, file, ensure_ascii=False, indent=4)
+    os.replace(f"{file_name}.tmp", file_name)
+
+
+class KeyStore:
+    """ Index of the hashed API keys of all users, loaded once and reloaded when the key file
+        changes (checked at most every check_interval seconds).
+    """
+
+    def __init__(self, file_name: str = KEY_FILE, check_interval: float = 1.,
+                 logger: Optional[logging.Logger] = None):
+        """ Load the key file.
+        Args:
+            file_name (str): Key file.
+            check_interval (float): Minimum time between two checks for changes (seconds).
+            logger (logging.Logger): Where to report reloads and a missing key file.
+        """
+        self.file_name = file_name
+        self.check_interval = check_interval
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._keys: Dict[str, Tuple[str, ...]] = {}
+        self._signature: Optional[Tuple[int, int]] = None
+        self._last_check = time.monotonic()
+        self._reload(self._current_signature())
+
+    def verify(self, user: str, key: str) -> bool:
+        """ Check the API key of a user, comparing in constant time.
+        Args:
+            user (str): Name of the user.
+            key (str): API key sent by the user.
+        Returns:
+            bool: True if the key belongs to the user, False otherwise (also for unknown users).
+        """
+        self.refresh()
+        hashed = hash_key(key)
+        # compare with all keys of the user, so the time does not tell which one matched
+        matches = [hmac.compare_digest(hashed, stored) for stored in self._keys.get(user, ())]
+
+        return any(matches)
+
+    def refresh(self) -> None:
+        """ Reload the keys if the key file changed (at most every check_interval). """
+        if time.monotonic() - self._last_check < self.check_interval:
+            return
+        if not self._lock.acquire(blocking=False):  # another thread is already checking
+            return
+
+        try:
+            self._last_check = time.monotonic()
+            signature = self._current_signature()
+            if signature != self._signature:
+                self._reload(signature)
+        finally:
+            self._lock.release()
+
+    def _current_signature(self) -> Optional[Tuple[int, int]]:
+        """ Modification time and size of the key file, None if it does not exist. """
+        try:
+            stat = os.stat(self.file_name)
+        except FileNotFoundError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    def _reload(self, signature: Optional[Tuple[int, int]]) -> None:
+        """ Read the key file and replace the index (no keys if the file is missing, the
+            previous ones if it cannot be read; it is read again at the next check then).
+        """
+        try:
+            keys = {user: tuple(stored) for user, stored in load_key_file(self.file_name).items()}
+        except FileNotFoundError:
+            self.logger.warning('Loading API keys from %s failed!', self.file_name)
+            keys = {}
+        except (OSError, ValueError):
+            self.logger.warning('Loading API keys from %s failed!', self.file_name)
+            return
+
+        self._keys = keys
+        self._signature = signature
+        self.logger.info('Loaded API keys of %i users.', len(keys))
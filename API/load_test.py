@@ -0,0 +1,326 @@
+""" Offline load test of the Flask API under gunicorn.
+
+Starts flask_app with gunicorn (same as start.sh) in a temporary directory with a generated
+api_keys.json, and with Scryfall replaced by a local fake (SCRYFALL_API), so nothing leaves the
+machine. The card art and badge caches are kept in the temporary directory as well
+(IMAGE_CACHE_ROOT), so the fake art never ends up in the server's caches. A fixed, seeded
+mix of requests is sent by concurrent clients for every worker count; requests/s and latency
+percentiles are reported per endpoint and written as JSON, so that runs before and after a
+change of the serving code can be compared.
+
+Usage:
+    python load_test.py --workers 1 2 4 --requests 2000 --concurrency 8 --output load.json
+"""
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+import json
+import os
+import platform
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Tuple, TypedDict
+from urllib.parse import quote, urlsplit
+
+import numpy as np
+from PIL import Image
+import requests
+
+from key_store import hash_key, KEY_FILE, save_key_file
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(API_DIR, 'data')
+
+# relative frequency of the endpoints, roughly as the frontend uses them
+ENDPOINT_MIX = {'hall_of_fame': 20, 'players_rounds_lists': 15, 'player_stats': 25,
+                'round_details': 20, 'popular_cards': 8, 'banned_list': 5, 'card_usage': 5,
+                'badge': 2}
+
+
+class Sample(TypedDict):
+    """ Outcome of a single request. """
+    endpoint: str
+    status: int
+    seconds: float
+    bytes: int
+
+
+class FakeScryfall(BaseHTTPRequestHandler):
+    """ Answers the three requests of get_card_image (named card, prints, art crop). """
+    art = b''
+
+    def do_GET(self) -> None:
+        base = f"http://{self.headers['Host']}"
+        path = urlsplit(self.path).path
+        if path == '/cards/named':
+            self.send(json.dumps({'prints_search_uri': f"{base}/cards/search"}).encode())
+        elif path == '/cards/search':
+            self.send(json.dumps({'data': [{'image_uris': {'art_crop': f"{base}/art.png"}}]
+                                  }).encode())
+        elif path == '/art.png':
+            self.send(self.art, 'image/png')
+        else:
+            self.send_error(404)
+
+    def send(self, body: bytes, content_type: str = 'application/json') -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def start_fake_scryfall() -> ThreadingHTTPServer:
+    """ Serve FakeScryfall on a free local port, in a background thread.
+    Returns:
+        ThreadingHTTPServer: The running server (call shutdown when done).
+    """
+    art = BytesIO()
+    Image.new('RGB', (626, 457), color='#468').save(art, 'PNG')
+    FakeScryfall.art = art.getvalue()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeScryfall)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def free_port() -> int:
+    """ Find a free local TCP port. """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def write_api_keys(directory: str, n_users: int) -> Dict[str, str]:
+    """ Write a key file (hashed, see key_store.py) with one key for each of n_users
+        generated users.
+    Args:
+        directory (str): Directory to write the file to (working directory of the server).
+        n_users (int): Number of users.
+    Returns:
+        Dict[str, str]: Key of every user.
+    """
+    keys = {f"load_test_{u}": secrets.token_urlsafe(16) for u in range(n_users)}
+    save_key_file({user: [hash_key(key)] for user, key in keys.items()},
+                  os.path.join(directory, KEY_FILE))
+
+    return keys
+
+
+def request_plan(n_requests: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """ Draw a reproducible sequence of requests from ENDPOINT_MIX, with players, rounds and
+        cards taken from the published data.
+    Args:
+        n_requests (int): Number of requests.
+        seed (int): Seed of the random generator.
+    Returns:
+        List[Tuple[str, str]]: Endpoint and path of every request.
+    """
+    with open(os.path.join(DATA_DIR, 'players_rounds_lists.json'), encoding='utf-8') as file:
+        lists = json.load(file)
+    with open(os.path.join(DATA_DIR, 'popular_cards.json'), encoding='utf-8') as file:
+        cards = [entry['card'] for entry in json.load(file)]
+    players, rounds = lists['player_names'], lists['round_numbers']
+
+    paths = {'hall_of_fame': lambda: '/hall_of_fame',
+             'players_rounds_lists': lambda: '/players_rounds_lists',
+             'player_stats': lambda: f"/playerstats/{quote(rng.choice(players), safe='')}",
+             'round_details': lambda: f"/round/{rng.choice(rounds)}",
+             'popular_cards': lambda: '/popular_cards',
+             'banned_list': lambda: '/banned_list',
+             'card_usage': lambda: f"/card/{quote(rng.choice(cards[:100]), safe='/')}",
+             'badge': lambda: f"/badge/{quote(rng.choice(players), safe='')}.png"}
+
+    # the card index is only there once analysis.py has run
+    has_card_index = os.path.exists(os.path.join(DATA_DIR, 'card_index.json'))
+    mix = {endpoint: weight for endpoint, weight in ENDPOINT_MIX.items()
+           if endpoint != 'card_usage' or has_card_index}
+
+    rng = random.Random(seed)
+    endpoints = rng.choices(list(mix), weights=list(mix.values()), k=n_requests)
+
+    return [(endpoint, paths[endpoint]()) for endpoint in endpoints]
+
+
+def start_server(work_dir: str, workers: int, port: int, scryfall_url: str) -> subprocess.Popen:
+    """ Start flask_app with gunicorn and wait until it answers.
+    Args:
+        work_dir (str): Working directory of the server (with api_keys.json, gets app.log and
+            the image caches).
+        workers (int): Number of gunicorn worker processes.
+        port (int): Local port to bind to.
+        scryfall_url (str): Base URL of the (fake) Scryfall API.
+    Returns:
+        subprocess.Popen: The gunicorn master process.
+    """
+    env = dict(os.environ, SCRYFALL_API=scryfall_url,
+               IMAGE_CACHE_ROOT=os.path.join(work_dir, 'cache'))
+    with open(os.path.join(work_dir, f"gunicorn_{workers}.log"), 'w') as log:
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'flask_app:app',
+                                   '--workers', str(workers), '--worker-class', 'gthread',
+                                   '--threads', '16', '--bind', f"127.0.0.1:{port}",
+                                   '--chdir', work_dir, '--pythonpath', API_DIR],
+                                  env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/badge_embedding/ping", timeout=1)
+            return server
+        except requests.ConnectionError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.2)
+
+    server.terminate()
+    raise RuntimeError(f"gunicorn did not start, see {work_dir}/gunicorn_{workers}.log")
+
+
+def run_load(base_url: str, plan: List[Tuple[str, str]], concurrency: int,
+             keys: Dict[str, str]) -> Tuple[List[Sample], float]:
+    """ Send all requests of the plan with concurrent clients (client c sends every
+        concurrency-th request, as one of the users).
+    Args:
+        base_url (str): URL of the server.
+        plan (List[Tuple[str, str]]): Endpoint and path of every request (see request_plan).
+        concurrency (int): Number of concurrent clients.
+        keys (Dict[str, str]): API key of every user.
+    Returns:
+        Tuple[List[Sample], float]: Outcome of every request and the wall time of all of them.
+    """
+    users = list(keys.items())
+    samples: List[List[Sample]] = [[] for _ in range(concurrency)]
+
+    def client(c: int) -> None:
+        user, key = users[c % len(users)]
+        session = requests.Session()
+        session.headers.update({'user-name': user, 'x-api-key': key})
+        for endpoint, path in plan[c::concurrency]:
+            start = time.perf_counter()
+            try:
+                response = session.get(base_url + path, timeout=60)
+                status, size = response.status_code, len(response.content)
+            except requests.RequestException:
+                status, size = 0, 0
+            samples[c].append({'endpoint': endpoint, 'status': status,
+                               'seconds': time.perf_counter() - start, 'bytes': size})
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return [s for client_samples in samples for s in client_samples], time.perf_counter() - start
+
+
+def summarize(samples: List[Sample], seconds: float) -> Dict[str, Dict[str, float]]:
+    """ Throughput and latency percentiles per endpoint (and 'all').
+    Args:
+        samples (List[Sample]): Outcome of every request.
+        seconds (float): Wall time of the run.
+    Returns:
+        Dict[str, Dict[str, float]]: Statistics by endpoint, latencies in milliseconds.
+    """
+    summary = {}
+    for endpoint in ['all'] + [e for e in ENDPOINT_MIX if any(s['endpoint'] == e for s in samples)]:
+        selected = [s for s in samples if endpoint in ('all', s['endpoint'])]
+        latencies = np.array([s['seconds'] for s in selected]) * 1000
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary[endpoint] = {'requests': len(selected),
+                             'errors': sum(not 200 <= s['status'] < 400 for s in selected),
+                             'requests_per_second': len(selected) / seconds,
+                             'mean_ms': float(latencies.mean()),
+                             'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99),
+                             'bytes': sum(s['bytes'] for s in selected)}
+
+    return summary
+
+
+def load_test(worker_counts: List[int], n_requests: int = 2000, concurrency: int = 8,
+              n_warmup: int = 100, n_users: int = 4, seed: int = 0) -> Dict[str, Any]:
+    """ Run the load test for every worker count.
+    Args:
+        worker_counts (List[int]): Numbers of gunicorn workers to test.
+        n_requests (int): Number of measured requests per worker count.
+        concurrency (int): Number of concurrent clients.
+        n_warmup (int): Number of requests sent before measuring (imports, file caches).
+        n_users (int): Number of generated API users.
+        seed (int): Seed of the request plan.
+    Returns:
+        Dict[str, Any]: Configuration, environment and statistics by worker count.
+    """
+    plan = request_plan(n_warmup + n_requests, seed)
+    scryfall = start_fake_scryfall()
+    runs = []
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            keys = write_api_keys(work_dir, n_users)
+            for workers in worker_counts:
+                port = free_port()
+                server = start_server(work_dir, workers, port,
+                                      f"http://127.0.0.1:{scryfall.server_port}")
+                try:
+                    run_load(f"http://127.0.0.1:{port}", plan[:n_warmup], concurrency, keys)
+                    samples, seconds = run_load(f"http://127.0.0.1:{port}", plan[n_warmup:],
+                                                concurrency, keys)
+                finally:
+                    server.terminate()
+                    server.wait()
+                runs.append({'workers': workers, 'seconds': seconds,
+                             'endpoints': summarize(samples, seconds)})
+    finally:
+        scryfall.shutdown()
+
+    return {'config': {'requests': n_requests, 'concurrency': concurrency, 'warmup': n_warmup,
+                       'users': n_users, 'seed': seed, 'mix': ENDPOINT_MIX},
+            'environment': {'python': platform.python_version(),
+                            'platform': platform.platform(), 'cpus': os.cpu_count()},
+            'runs': runs}
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    """ Print a table of all statistics.
+    Args:
+        results (Dict[str, Any]): Output of load_test.
+    """
+    for run in results['runs']:
+        print(f"\n{run['workers']} worker(s), {results['config']['concurrency']} clients, "
+              f"{run['seconds']:.2f} s")
+        print(f"  {'endpoint':<22}{'requests':>9}{'errors':>7}{'req/s':>9}"
+              f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for endpoint, stats in run['endpoints'].items():
+            print(f"  {endpoint:<22}{stats['requests']:>9}{stats['errors']:>7}"
+                  f"{stats['requests_per_second']:>9.1f}{stats['p50_ms']:>9.1f}"
+                  f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the Flask API under gunicorn.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=100)
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = load_test(args.workers, args.requests, args.concurrency, args.warmup, args.users,
+                        args.seed)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
@@ -0,0 +1,99 @@
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+
+from history import (as_history, History, npz_archive, result_positions, round_sizes,
+                     row_positions, select_rounds)
+
+# match-centric table of the full history, kept up to date (and published) by analysis.py
+MATCH_TABLE_ARTIFACT = 'match_data.npz'
+MATCH_TABLE_FILE = f"data/{MATCH_TABLE_ARTIFACT}"
+
+
+def build_match_table(data: Union[pd.DataFrame, History]) -> pd.DataFrame:
+    """ Build the match-centric table (one row for every player and opponent of every round)
+        straight from the flat results buffer of the history (see history.History).
+    Args:
+        data (History or pd.DataFrame): Round history with 'round', 'player' and 'result_*'
+            columns, the rows of a round in the order of its 'result_*' columns.
+    Returns:
+        pd.DataFrame: Columns 'player_1', 'points_player_1', 'player_2', 'points_player_2'
+            and 'round', sorted by round.
+    """
+    history = as_history(data)
+    sizes = round_sizes(history)
+    players = history['players'][history['player_codes']]
+    position = row_positions(history)
+    first = np.repeat(history['offsets'][:-1], sizes)
+    row_start = (np.repeat(history['result_offsets'][:-1], sizes)
+                 + position * np.repeat(sizes, sizes))  # of the row in the results buffer
+
+    # every entry of the results buffer, without the results of players against themselves
+    row, column = result_positions(history)
+    entry = np.flatnonzero(column != position[row])
+    row, column = row[entry], column[entry]
+    opponent = first[row] + column
+
+    return pd.DataFrame({'player_1': players[row],
+                         'points_player_1': history['results'][entry].astype(int),
+                         'player_2': players[opponent],
+                         'points_player_2': history['results'][row_start[opponent]
+                                                               + position[row]].astype(int),
+                         'round': np.repeat(history['rounds'], sizes)[row]})
+
+
+def update_match_table(match_df: pd.DataFrame, data: Union[pd.DataFrame, History],
+                       rounds: List[int]) -> pd.DataFrame:
+    """ Replace the matches of some rounds (e.g. new ones) in an existing match table.
+    Args:
+        match_df (pd.DataFrame): Match table to update (see build_match_table).
+        data (History or pd.DataFrame): Round history containing (at least) the rounds to
+            update.
+        rounds (list[int]): Numbers of the rounds to replace, add or remove.
+    Returns:
+        pd.DataFrame: Updated match table, sorted by round.
+    """
+    kept = match_df.loc[~match_df['round'].isin(rounds)]
+    new = build_match_table(select_rounds(as_history(data), rounds))
+
+    return (pd.concat([kept, new])
+            .sort_values('round', kind='stable')
+            .reset_index(drop=True))
+
+
+def match_table_archive(match_df: pd.DataFrame) -> bytes:
+    """ Pack the match table as npz archive (player names stored once, everything else as
+        integer arrays), to be published as MATCH_TABLE_ARTIFACT.
+    Args:
+        match_df (pd.DataFrame): Match table (see build_match_table).
+    Returns:
+        bytes: Content of the archive.
+    """
+    players, player_ids = np.unique(np.concatenate([match_df['player_1'].to_numpy(dtype=str),
+                                                    match_df['player_2'].to_numpy(dtype=str)]),
+                                    return_inverse=True)
+
+    return npz_archive({'players': players,
+                        'player_1': player_ids[:len(match_df)],
+                        'points_player_1': match_df['points_player_1'].to_numpy(dtype=np.int8),
+                        'player_2': player_ids[len(match_df):],
+                        'points_player_2': match_df['points_player_2'].to_numpy(dtype=np.int8),
+                        'round': match_df['round'].to_numpy()})
+
+
+def load_match_table(file_name: str = MATCH_TABLE_FILE) -> pd.DataFrame:
+    """ Load the match table published by analysis.py (see match_table_archive).
+    Args:
+        file_name (str): Path of the archive.
+    Returns:
+        pd.DataFrame: Match table (see build_match_table).
+    """
+    with np.load(file_name) as archive:
+        players = archive['players'].astype(object)
+
+        return pd.DataFrame({'player_1': players[archive['player_1']],
+                             'points_player_1': archive['points_player_1'].astype(int),
+                             'player_2': players[archive['player_2']],
+                             'points_player_2': archive['points_player_2'].astype(int),
+                             'round': archive['round']})
@@ -0,0 +1,109 @@
+""" Render the badges of all players ahead of time (build stage, after analysis.py).
+
+Every distinct card art is fetched once (through the card art cache shared with the server),
+then the badges are rendered in a process pool and published to data/badges/ with content
+hashes in their file names, next to an index (PRERENDERED_INDEX) of the file and the cache key
+(player data and layout version) of every badge. The server sends a pre-rendered badge while
+its key matches the player's current data, and renders on request otherwise.
+
+Usage:
+    python prerender_badges.py [--workers 4]
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+from typing import Dict, List, Optional, Tuple, TypedDict
+
+from analysis import publish_artifacts
+from badge_image import (ART_CACHE_BYTES, ART_CACHE_DIR, badge_card, badge_key, cache_dir,
+                         CardArt, load_font, PRERENDERED_DIR, PRERENDERED_INDEX, render_badge,
+                         ScryfallFetcher)
+from disk_cache import DiskCache
+from response_cache import content_hash
+
+DATA_DIR = 'data'
+
+
+class PrerenderedBadge(TypedDict):
+    """ Entry of the index of pre-rendered badges. """
+    file: str
+    key: str
+
+
+def render_job(job: Tuple[str, Optional[bytes]]) -> bytes:
+    """ Render one badge (in a worker process).
+    Args:
+        job (Tuple[str, Optional[bytes]]): Name of the player and the card art of the badge.
+    Returns:
+        bytes: PNG file of the badge.
+    """
+    player, art = job
+    return render_badge(player, art, load_font())
+
+
+def prerender_badges(data_dir: str = DATA_DIR, card_art: Optional[CardArt] = None,
+                     workers: Optional[int] = None) -> Dict[str, PrerenderedBadge]:
+    """ Render and publish the badges of all players. Badges whose card art cannot be fetched
+        are left out (rendered on request, when the art may be available again).
+    Args:
+        data_dir (str): Directory with the published artifacts.
+        card_art (CardArt): Source of the card art (Scryfall with the server's cache if None).
+        workers (int): Number of rendering processes (one per core if None).
+    Returns:
+        Dict[str, PrerenderedBadge]: The published index.
+    """
+    if card_art is None:
+        card_art = CardArt(ScryfallFetcher(),
+                           DiskCache(cache_dir(data_dir, ART_CACHE_DIR), ART_CACHE_BYTES))
+
+    lists_file = os.path.join(data_dir, 'players_rounds_lists.json')
+    with open(lists_file, 'r', encoding='utf-8') as file:
+        players = json.load(file)['player_names']
+
+    keys, cards = {}, {}
+    for player in players:
+        with open(os.path.join(data_dir, f"players/{player}.json"), 'rb') as file:
+            content = file.read()
+        keys[player] = badge_key(player, content_hash(content))
+        cards[player] = badge_card(json.loads(content))
+
+    arts = {card: card_art.get(card) for card in set(cards.values()) if card is not None}
+    jobs: List[Tuple[str, Optional[bytes]]] = [
+        (player, arts.get(cards[player])) for player in players
+        if cards[player] is None or arts[cards[player]] is not None]
+
+    with ProcessPoolExecutor(workers) as executor:
+        images = list(executor.map(render_job, jobs))
+
+    artifacts = {}
+    index: Dict[str, PrerenderedBadge] = {}
+    for (player, _), image in zip(jobs, images):
+        file_name = f"{PRERENDERED_DIR}/{player}.{content_hash(image)[:16]}.png"
+        artifacts[file_name] = image
+        index[player] = {'file': file_name, 'key': keys[player]}
+
+    previous = {}
+    if os.path.exists(os.path.join(data_dir, PRERENDERED_INDEX)):
+        with open(os.path.join(data_dir, PRERENDERED_INDEX), 'r', encoding='utf-8') as file:
+            previous = json.load(file)
+
+    artifacts[PRERENDERED_INDEX] = index  # last, after the files it refers to
+    publish_artifacts(artifacts, [data_dir])
+
+    # the previous badges stay, for servers that have not reloaded the index yet
+    keep = {entry['file'] for entry in [*index.values(), *previous.values()]}
+    for file_name in os.listdir(os.path.join(data_dir, PRERENDERED_DIR)):
+        if file_name.endswith('.png') and f"{PRERENDERED_DIR}/{file_name}" not in keep:
+            os.remove(os.path.join(data_dir, PRERENDERED_DIR, file_name))
+
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-render the badges of all players.')
+    parser.add_argument('--workers', type=int, help='rendering processes (default: all cores)')
+    args = parser.parse_args()
+
+    published = prerender_badges(workers=args.workers)
+    print(f"Pre-rendered {len(published)} badges to {DATA_DIR}/{PRERENDERED_DIR}.")
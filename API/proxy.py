@@ -1,42 +1,154 @@
+import os
+import select
+import socket
+import threading
+from urllib.parse import urlsplit
+
+from flask import Blueprint, make_response, redirect, request, Response
 import requests
-from flask import Blueprint, request, Response
-
-# Streamlit server location (internal, same container)
-STREAMLIT_URL = "http://localhost:8501"
-
-reverse_proxy = Blueprint("reverse_proxy", __name__)
-
-@reverse_proxy.route("/", defaults={"path": ""}, methods=["GET", "POST", "PUT", "DELETE"])
-@reverse_proxy.route("/<path:path>", methods=["GET", "POST", "PUT", "DELETE"])
-def proxy(path):
-    # Forward the incoming request to Streamlit
-    url = f"{STREAMLIT_URL}/{path}"
-
-    # Forward headers except Host (Streamlit handles its own host)
-    headers = {key: value for key, value in request.headers if key.lower() != "host"}
-
-    # Forward request based on method
-    resp = requests.request(
-        method=request.method,
-        url=url,
-        params=request.args,
-        data=request.get_data(),
-        cookies=request.cookies,
-        headers=headers,
-        stream=True,
-    )
-
-    # Filter out headers that would break Flask's Response object
-    excluded = {"content-encoding", "content-length", "transfer-encoding", "connection"}
-    response_headers = [
-        (name, value) for name, value in resp.raw.headers.items()
-        if name.lower() not in excluded
-    ]
-
-    # Return proxied response
-    return Response(
-        resp.raw,
-        status=resp.status_code,
-        headers=response_headers
-    )
+from requests.adapters import HTTPAdapter
+
+# Streamlit server location (internal, same container, see start.sh)
+STREAMLIT_URL = os.environ.get('STREAMLIT_URL', 'http://127.0.0.1:8501')
+# connect and read timeout of proxied requests, idle timeout of WebSocket tunnels (seconds)
+TIMEOUT = (3.05, 30.)
+TUNNEL_IDLE_TIMEOUT = 300.
+# every open WebSocket tunnel (one per dashboard tab) holds a server thread until it closes:
+# at most this many per worker process, fewer than its threads (see start.sh), so that the
+# others stay free for requests; tunnels above the limit are refused with 503
+MAX_TUNNELS = int(os.environ.get('MAX_TUNNELS', 8))
+# proxied bodies are passed on in chunks of this size, never held in memory as a whole
+CHUNK_SIZE = 64 * 1024
+# hop-by-hop headers, which only apply to one connection and are not forwarded
+HOP_BY_HOP = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te',
+              'trailer', 'transfer-encoding', 'upgrade'}
+
+# one pool of connections to Streamlit, shared by all requests (and threads)
+session = requests.Session()
+session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=16))
+
+# Mount Streamlit under /dashboard
+reverse_proxy = Blueprint('reverse_proxy', __name__)
+tunnel_slots = threading.BoundedSemaphore(MAX_TUNNELS)
+
+
+class TunnelClosed(Response):
+    """ Response after a WebSocket tunnel: the connection was taken over and is finished, so
+        nothing may be written to it. The server is told to drop the connection instead.
+    """
+
+    def __call__(self, environ, start_response):
+        if 'gunicorn.socket' in environ:
+            raise StopIteration()  # gunicorn closes the connection
+        raise ConnectionError()  # werkzeug development server: connection dropped
+
+
+@reverse_proxy.route('/dashboard')
+def dashboard_redirect():
+    return redirect('/dashboard/', code=302)
+
+
+@reverse_proxy.route('/dashboard/', defaults={'path': ''},
+                     methods=['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'])
+@reverse_proxy.route('/dashboard/<path:path>',
+                     methods=['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'])
+def dashboard_proxy(path):
+    """ Forward a request to Streamlit (which runs with baseUrlPath dashboard) and stream the
+        response back.
+    Args:
+        path (str): Path below /dashboard/.
+    Returns:
+        (response): Streamlit's response.
+    """
+    # Forward headers except Host (Streamlit handles its own host) and hop-by-hop headers
+    headers = {key: value for key, value in request.headers
+               if key.lower() != 'host' and key.lower() not in HOP_BY_HOP}
+
+    try:
+        resp = session.request(
+            method=request.method,
+            url=f"{STREAMLIT_URL}/dashboard/{path}",
+            params=request.args,
+            data=request.stream if request.content_length else None,
+            headers=headers,
+            allow_redirects=False,
+            stream=True,
+            timeout=TIMEOUT,
+        )
+    except requests.RequestException:
+        return make_response('Dashboard not available.', 502)
+
+    # the body is passed on as received (still encoded), so its length and encoding hold
+    response_headers = [(name, value) for name, value in resp.raw.headers.items()
+                        if name.lower() not in HOP_BY_HOP]
+    response = Response(resp.raw.stream(CHUNK_SIZE, decode_content=False),
+                        status=resp.status_code, headers=response_headers)
+    response.call_on_close(resp.close)  # return the connection to the pool
+
+    return response
+
+
+# WebSocket upgrades only match rules marked as such, e.g. the session channel of Streamlit
+# (/dashboard/_stcore/stream)
+@reverse_proxy.route('/dashboard/<path:path>', websocket=True)
+def dashboard_websocket(path):
+    """ Take over the client connection and tunnel it to Streamlit, byte for byte: the
+        handshake is forwarded as received, then data flows both ways until one side closes
+        or the tunnel is idle for TUNNEL_IDLE_TIMEOUT.
+    Args:
+        path (str): Path below /dashboard/ (forwarded with the handshake).
+    Returns:
+        (response): TunnelClosed after the tunnel, an error if it could not be opened (503
+            if MAX_TUNNELS are open already).
+    """
+    client = request.environ.get('gunicorn.socket') or request.environ.get('werkzeug.socket')
+    if client is None:
+        return make_response('WebSocket connections are not supported by this server.', 501)
+
+    if not tunnel_slots.acquire(blocking=False):
+        response = make_response('Too many dashboard connections, try again later.', 503)
+        response.retry_after = 30
+        return response
+
+    try:
+        target = urlsplit(STREAMLIT_URL)
+        try:
+            upstream = socket.create_connection((target.hostname, target.port or 80),
+                                                timeout=TIMEOUT[0])
+        except OSError:
+            return make_response('Dashboard not available.', 502)
+
+        # the Host header is kept: Streamlit compares it with the Origin of the WebSocket
+        handshake = [f"GET {request.full_path.rstrip('?')} HTTP/1.1"]
+        handshake += [f"{key}: {value}" for key, value in request.headers]
+        with upstream:
+            upstream.sendall(('\r\n'.join(handshake) + '\r\n\r\n').encode('latin-1'))
+            pump(client, upstream)
+    finally:
+        tunnel_slots.release()
+
+    return TunnelClosed(status=101)
+
+
+def pump(client: socket.socket, upstream: socket.socket) -> None:
+    """ Copy data between two sockets in both directions until one of them is closed.
+    Args:
+        client (socket.socket): Connection of the client.
+        upstream (socket.socket): Connection to Streamlit.
+    """
+    peers = {client: upstream, upstream: client}
+    client.setblocking(True)
+    upstream.setblocking(True)
 
+    try:
+        while True:
+            readable, _, _ = select.select(list(peers), [], [], TUNNEL_IDLE_TIMEOUT)
+            if not readable:  # idle
+                return
+            for sock in readable:
+                data = sock.recv(CHUNK_SIZE)
+                if not data:
+                    return
+                peers[sock].sendall(data)
+    except OSError:  # reset by either side
+        return
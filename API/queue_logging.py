@@ -0,0 +1,64 @@
+import atexit
+import logging
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener
+import queue
+
+
+class BatchHandler(MemoryHandler):
+    """ Buffer records and pass them on to the target handler in batches: when the buffer is
+        full, for records of flushLevel or above, and when the oldest buffered record is
+        older than max_delay seconds (checked as records arrive, and by BatchListener while
+        none arrive; the rest is flushed on close).
+    """
+
+    def __init__(self, capacity: int, target: logging.Handler, max_delay: float = 5.,
+                 flushLevel: int = logging.WARNING):
+        super().__init__(capacity, flushLevel=flushLevel, target=target)
+        self.max_delay = max_delay
+
+    def shouldFlush(self, record: logging.LogRecord) -> bool:
+        return (super().shouldFlush(record)
+                or record.created - self.buffer[0].created >= self.max_delay)
+
+
+class BatchListener(QueueListener):
+    """ Queue listener that flushes its BatchHandler when no record arrived for max_delay
+        seconds, so that records are written even while traffic is low.
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, batches: BatchHandler):
+        super().__init__(log_queue, batches, respect_handler_level=True)
+        self.batches = batches
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        while block:
+            try:
+                return self.queue.get(timeout=self.batches.max_delay)
+            except queue.Empty:  # idle: every buffered record is at least max_delay old
+                self.batches.flush()
+
+        return self.queue.get(block=False)
+
+
+def start_queue_logging(logger: logging.Logger, handler: logging.Handler,
+                        batch_size: int = 100) -> QueueListener:
+    """ Log through a queue: the logger only enqueues its records, a background thread writes
+        them to the handler in batches (at most about max_delay seconds late). The remaining
+        records are written at exit.
+    Args:
+        logger (logging.Logger): Logger whose records are written in the background.
+        handler (logging.Handler): Handler that writes the records (e.g. to a file).
+        batch_size (int): Maximum number of records per batch.
+    Returns:
+        QueueListener: The running background writer.
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    batches = BatchHandler(batch_size, handler)
+    batches.setLevel(handler.level)
+
+    listener = BatchListener(log_queue, batches)
+    logger.addHandler(QueueHandler(log_queue))
+    listener.start()
+    atexit.register(listener.stop)  # before logging.shutdown flushes the buffered batch
+
+    return listener
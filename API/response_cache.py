@@ -0,0 +1,194 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, TypedDict
+
+# written last by analysis.publish_artifacts, so one stat tells whether anything was published
+MANIFEST_FILE = 'manifest.json'
+# directories below the data directory that hold no published artifacts
+SKIPPED_DIRS = {'cache', 'raw'}
+# precompressed siblings written by analysis.publish_artifacts (e.g. x.json.gz), by encoding
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+Signature = Tuple[Tuple[str, int, int], ...]
+
+
+class BaseVariant(TypedDict):
+    """ Body of an artifact in one content encoding and its entity tag (a hash of the body,
+        for conditional requests).
+    """
+    body: bytes
+    etag: str
+
+
+class Variant(BaseVariant, total=False):
+    """ Variant with the parsed artifact and the views derived from it (identity only, once
+        they were needed, see get_json and get_view).
+    """
+    data: Any
+    views: Dict[Callable[[Any], Any], Any]
+
+
+# variants of an artifact by content encoding ('identity' and the precompressed ones)
+Artifact = Dict[str, Variant]
+
+
+class ResponseCache:
+    """ All JSON artifacts of a data directory, as response bodies (with their precompressed
+        siblings) keyed by their path relative to the directory (e.g. 'rounds/12.json'). A
+        sibling older than its artifact is outdated and ignored. The files are checked
+        for changes at most every check_interval seconds: the manifest if there is one, the
+        modification times of all artifacts otherwise. Changed artifacts are reloaded by one
+        request while the others keep serving the old bodies; the new set replaces the old
+        one at once, so a response never mixes two versions.
+    """
+
+    def __init__(self, data_dir: Path, check_interval: float = 1.,
+                 logger: Optional[logging.Logger] = None):
+        """ Load all artifacts.
+        Args:
+            data_dir (Path): Directory with the published artifacts.
+            check_interval (float): Minimum time between two checks for changes (seconds).
+            logger (logging.Logger): Where to report reloads and unreadable files.
+        """
+        self.data_dir = Path(data_dir)
+        self.check_interval = check_interval
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._artifacts: Dict[str, Artifact] = {}
+        self._signature: Optional[Signature] = None
+        self._last_check = time.monotonic()
+        self._reload(self._current_signature())
+
+    def get(self, path: str) -> Optional[Artifact]:
+        """ Response bodies and entity tags of an artifact.
+        Args:
+            path (str): Path of the artifact relative to the data directory.
+        Returns:
+            Optional[Artifact]: Available variants, None if there is no such artifact.
+        """
+        self.refresh()
+        return self._artifacts.get(path)
+
+    def get_json(self, path: str) -> Any:
+        """ Parsed artifact, parsed only once per version of the artifact.
+        Args:
+            path (str): Path of the artifact relative to the data directory.
+        Returns:
+            Any: JSON data of the artifact, None if there is no such artifact.
+        """
+        artifact = self.get(path)
+        if artifact is None:
+            return None
+
+        return parse_variant(artifact['identity'])
+
+    def get_view(self, path: str, build: Callable[[Any], Any]) -> Any:
+        """ Structure derived from an artifact (e.g. a lookup table), built only once per
+            version of the artifact, so it is replaced together with the artifact.
+        Args:
+            path (str): Path of the artifact relative to the data directory.
+            build (Callable[[Any], Any]): Builds the view from the JSON data of the artifact
+                (also the key of the view, so a module level function).
+        Returns:
+            Any: The view, None if there is no such artifact.
+        """
+        artifact = self.get(path)
+        if artifact is None:
+            return None
+
+        identity = artifact['identity']
+        views = identity.setdefault('views', {})
+        if build not in views:
+            views[build] = build(parse_variant(identity))
+        return views[build]
+
+    def refresh(self) -> None:
+        """ Reload the artifacts if they changed on disk (at most every check_interval). """
+        if time.monotonic() - self._last_check < self.check_interval:
+            return
+        if not self._lock.acquire(blocking=False):  # another thread is already checking
+            return
+
+        try:
+            self._last_check = time.monotonic()
+            signature = self._current_signature()
+            if signature != self._signature:
+                self._reload(signature)
+        finally:
+            self._lock.release()
+
+    def _artifact_files(self) -> Dict[str, Path]:
+        """ All JSON artifacts of the data directory, by relative path. """
+        files = {}
+        for directory, sub_dirs, file_names in os.walk(self.data_dir):
+            if Path(directory) == self.data_dir:
+                sub_dirs[:] = [d for d in sub_dirs if d not in SKIPPED_DIRS]
+            for file_name in file_names:
+                if file_name.endswith('.json'):
+                    file = Path(directory) / file_name
+                    files[file.relative_to(self.data_dir).as_posix()] = file
+
+        return files
+
+    def _current_signature(self) -> Signature:
+        """ Modification time and size of the manifest, or of all artifacts without one. """
+        manifest = self.data_dir / MANIFEST_FILE
+        files = {MANIFEST_FILE: manifest} if manifest.exists() else self._artifact_files()
+
+        signature = []
+        for path, file in sorted(files.items()):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:  # replaced or removed while scanning
+                continue
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+
+        return tuple(signature)
+
+    def _reload(self, signature: Signature) -> None:
+        """ Read and hash all artifacts and their siblings, then replace the served set. """
+        artifacts: Dict[str, Artifact] = {}
+        for path, file in self._artifact_files().items():
+            try:
+                artifact = {'identity': read_variant(file)}
+                modified = file.stat().st_mtime_ns
+            except OSError:
+                self.logger.warning('Loading artifact %s failed!', path)
+                continue
+
+            for encoding, suffix in ENCODING_SUFFIXES.items():
+                sibling = file.with_name(f"{file.name}{suffix}")
+                try:
+                    if sibling.stat().st_mtime_ns >= modified:
+                        artifact[encoding] = read_variant(sibling)
+                except OSError:  # not published (e.g. no brotli) or replaced meanwhile
+                    continue
+            artifacts[path] = artifact
+
+        self._artifacts = artifacts
+        self._signature = signature
+        self.logger.info('Loaded %i artifacts from %s.', len(artifacts), self.data_dir)
+
+
+def content_hash(body: bytes) -> str:
+    """ Entity tag of a response body. """
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def parse_variant(variant: Variant) -> Any:
+    """ JSON data of a variant (identity), parsed on first use. """
+    if 'data' not in variant:
+        variant['data'] = json.loads(variant['body'])
+    return variant['data']
+
+
+def read_variant(file: Path) -> Variant:
+    """ Read a response body from a file and hash it. """
+    body = file.read_bytes()
+    return {'body': body, 'etag': content_hash(body)}
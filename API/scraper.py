@@ -7,6 +7,8 @@ import re
 import requests
 import sys
 
+from analysis import find_result_errors
+
 def find_rounds_in_page(url):
     response = requests.get(url)
     soup = BeautifulSoup(response.text, 'html.parser')
@@ -41,24 +43,6 @@ def fix_player_name_typos(df):
 
     return df
 
-def check_results(res):
-    if res.shape[0] != res.shape[1]: # should be square
-        return False
-
-    # check if results table is consistent; possible results: 6-0, 4-1, 3-3, ...
-    valid_results = {('00', '06'), ('06', '00'),
-                     ('01', '04'), ('04', '01'),
-                     ('02', '02'), ('03', '03')}
-
-    is_valid = True
-    for i in range(res.shape[0]):
-        for j in range(i+1, res.shape[1]):
-            if (res[i,j], res[j,i]) not in valid_results:
-                print(f"{i+1} {j+1}: {res[i,j]}-{res[j,i]}")
-                is_valid = False
-
-    return is_valid
-
 def check_card_name(cardName):
     # check if the given card name exists, otherwise flag a problem
     # try to get a response from scryfall API
@@ -146,14 +130,23 @@ def find_data_in_round(url, round_number):
                     data_dict[f"card_{j+1}"] += [None]
 
         results = np.array(results)
-        if not check_results(results):
-            print(f"Problem with results in round {round_number}")
-            #return False
         results[results=='xx'] = '00'
         for i in range(results.shape[1]):
             data_dict[f"result_{i}"] = results[:, i]
         data_dict['round'] = np.ones(len(player_names), dtype=int) * round_number
         data = pd.DataFrame(data_dict)
+
+        # check if results table is consistent (same check as in analysis.py)
+        errors = find_result_errors(data)
+        for error in errors:
+            if error['i'] is None:  # concerns the whole table, e.g. not square
+                print(f"Error in results ({round_number}): {error['reason']}, "
+                      f"shape {results.shape}")
+            else:
+                print(f"{error['i']} {error['j']}: {error['reason']} {error['values']}")
+        if errors:
+            print(f"Problem with results in round {round_number}")
+            #return False
         print(data.sample(5))
 
         data = fix_player_name_typos(data)
@@ -7,6 +7,14 @@ streamlit run streamlit_app.py \
   --server.address 127.0.0.1 \
   --server.baseUrlPath dashboard &
 
-# Start Flask as the public server
+# Start Flask as the public server (threads, so that tunnelled dashboard WebSockets neither
+# block other requests nor count as hanging requests for the worker timeout). Every open
+# dashboard tab holds one thread of a worker; proxy.py refuses tunnels above MAX_TUNNELS per
+# worker (503), which keeps THREADS - MAX_TUNNELS threads free for API requests. Raise both
+# (or WORKERS) together for more concurrent dashboard users.
+export MAX_TUNNELS=${MAX_TUNNELS:-8}
 gunicorn flask_app:app \
+  --workers ${WORKERS:-1} \
+  --worker-class gthread \
+  --threads ${THREADS:-16} \
   --bind 0.0.0.0:$PORT
\ No newline at end of file
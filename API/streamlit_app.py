@@ -1,47 +1,20 @@
-from glob import glob
-import json
-
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from natsort import natsorted, ns
 import streamlit as st
 
+from elo_history import load_elo_history
+from match_table import load_match_table
+
 
 @st.cache_data
 def load_match_data() -> tuple[pd.DataFrame, list[str]]:
-    """ Load the full match history from raw round data.
+    """ Load the full match history, as prepared by analysis.py.
     Returns:
         tuple[pd.DataFrame, list[str]]: Match-centric DataFrame and list of all players.
     """
-    def get_transform_round_df(csv_file: str) -> pd.DataFrame:
-        """ Get df for a single ronud and transform to match-centric format. """
-        df = pd.read_csv(csv_file, sep=';')
-
-        round_number = df['round'].iloc[0]
-        df = df.drop('round', axis=1)
-        df = df.drop([col for col in df.columns if col.startswith('card_')], axis=1)
-
-        player_dict = dict(zip([col for col in df.columns if col.startswith('result_')],
-                               df['player'].tolist()))
-        df = df.rename(columns=player_dict)
-
-        df_long = df.melt(id_vars='player', var_name='opponent', value_name='points_player')
-        df_long = df_long[df_long['player'] != df_long['opponent']]
-
-        df_matches = df_long.merge(df_long,
-                                   left_on=['player', 'opponent'],
-                                   right_on=['opponent', 'player'],
-                                   suffixes=('_1', '_2'))
-        df_matches = df_matches.drop(['opponent_1', 'opponent_2'], axis=1)
-        df_matches['round'] = round_number
-
-        return df_matches
-
-    round_dfs = []
-    for csv in natsorted(glob('data/raw/round_*.csv')):
-        round_dfs.append(get_transform_round_df(csv))
-
-    data = pd.concat(round_dfs)
+    data = load_match_table()
     all_players = natsorted(data['player_1'].unique(), alg=ns.IGNORECASE)
 
     return data, all_players
@@ -65,26 +38,17 @@ def convert_to_ohlc_series(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
-@st.cache_data
-def load_elo_data() -> pd.DataFrame:
-    """ Load ELO ratings for all players.
+@st.cache_resource
+def load_elo_data() -> tuple[np.ndarray, dict[str, int], list[int]]:
+    """ Memory-map the ELO ratings of all players, as published by analysis.py.
     Returns:
-        pd.DataFrame: Ready for plotting.
+        tuple[np.ndarray, dict[str, int], list[int]]: Matrix of ratings (rounds x players),
+            column of every player and round of every row.
     """
-    def read_player_json(f_name) -> list[float]:
-        """ Extract the raw data from player json files. """
-        with open(f_name, 'r', encoding='utf-8') as file:
-            json_dict = json.load(file)
-        return json_dict['elo_list']
-
-    elo_data = {}
-    for json_file in glob('data/players/*.json'):
-        player_name = json_file.split('/')[-1][:-5]
-        elo_data[player_name] = read_player_json(json_file)
-
-    elo_data['round'] = list(range(1, len(elo_data[player_name])+1))
+    elo, index = load_elo_history()
+    columns = {player: i for i, player in enumerate(index['players'])}
 
-    return pd.DataFrame(elo_data)
+    return elo, columns, index['rounds']
 
 def make_versus_plot(df: pd.DataFrame, p1: str, p2: str) -> go.Figure:
     """ Prepare the PvP plot, showing the match history between two players.
@@ -106,25 +70,28 @@ def make_versus_plot(df: pd.DataFrame, p1: str, p2: str) -> go.Figure:
 
     return fig
 
-def make_elo_plot(df: pd.DataFrame, p1: str, p2: str) -> go.Figure:
+def make_elo_plot(elo: tuple[np.ndarray, dict[str, int], list[int]], p1: str,
+                  p2: str) -> go.Figure:
     """ Prepare the ELO plot, comparing the history of 2 players.
     Args:
-        df (pd.DataFrame): Full data for all players.
+        elo (tuple[np.ndarray, dict[str, int], list[int]]): ELO data of all players (see
+            load_elo_data), only the columns of the 2 players are read.
         p1 (str): Name of player 1.
         p2 (str): Name of player 2.
     Returns:
         go.Figure: Figure to show.
     """
+    matrix, columns, rounds = elo
     fig = go.Figure()
 
-    fig.add_trace(go.Scatter(x=df['round'],
-                             y=df[p1],
+    fig.add_trace(go.Scatter(x=rounds,
+                             y=matrix[:, columns[p1]],
                              mode='lines',
                              name=p1,
                              line={'color': 'green'}))
 
-    fig.add_trace(go.Scatter(x=df['round'],
-                             y=df[p2],
+    fig.add_trace(go.Scatter(x=rounds,
+                             y=matrix[:, columns[p2]],
                              mode='lines',
                              name=p2,
                              line={'color': 'red'}))
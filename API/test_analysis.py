@@ -0,0 +1,89 @@
+""" Regression test of the derived columns ('sum', '%' and 'place') of all rounds.
+
+The vectorized add_derivates_to_round is compared with the previous implementation, which
+handled one round at a time (kept here as legacy_add_derivates). Run from API/ with
+    python -m pytest test_analysis.py
+"""
+import glob
+import os
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import add_derivates_to_round, read_round, round_number_from_file
+from history import history_frame, history_from_rounds
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+RAW_FILES = sorted(glob.glob(os.path.join(API_DIR, 'data/raw/round_*.csv')),
+                   key=round_number_from_file)
+
+
+def legacy_add_derivates(df: pd.DataFrame) -> None:
+    """ Add derivative columns to the DataFrame of a single round (previous implementation).
+    Args:
+        df (pandas DataFrame): One round, as read from its raw file.
+    """
+    df['sum'] = df.loc[:, df.columns.str.startswith('result_')].sum(axis=1)
+
+    df['%'] = df['sum'] / (len(df)-1) / 6 * 100
+
+    # has to be done after computing '%'
+    if 'bonus' in df.columns:  # e.g. round 65
+        df['sum'] = df['sum'] + df['bonus']
+
+    if df.at[0, 'round'] in [75, 79]:  # least points win
+        ascending = True
+    else:
+        ascending = False
+
+    df['place'] = df['sum'].rank(method='min', ascending=ascending).astype(int)
+    if df.at[0, 'round'] >= 30:  # introduction of tiebreaker rule in round 30
+        for pl in df['place'].unique():
+            indices = df.index[df['place'] == pl]
+            row_sums = df.loc[indices, [f"result_{idx}" for idx in indices]].sum(axis=1)
+            ranks = row_sums.rank(method='min', ascending=ascending).astype(int)
+            df.loc[indices, 'place'] = ranks + pl - 1
+
+
+@pytest.fixture(scope='module')
+def rounds() -> List[pd.DataFrame]:
+    """ All valid rounds of the raw data, without derived columns. """
+    round_dfs = [read_round(file) for file in RAW_FILES]
+    return [df for df in round_dfs if df is not None]
+
+
+def test_raw_data_available(rounds: List[pd.DataFrame]) -> None:
+    assert len(rounds) >= 160
+
+
+def test_full_history_matches_legacy(rounds: List[pd.DataFrame]) -> None:
+    history = history_from_rounds(rounds)
+    add_derivates_to_round(history)
+    frame = history_frame(history)
+
+    expected = []
+    for df in rounds:
+        df = df.copy()
+        legacy_add_derivates(df)
+        expected.append(df)
+    expected_frame = pd.concat(expected, ignore_index=True)
+
+    np.testing.assert_array_equal(frame['round'], expected_frame['round'])
+    np.testing.assert_array_equal(frame['player'], expected_frame['player'])
+    np.testing.assert_array_equal(frame['place'], expected_frame['place'])
+    np.testing.assert_array_equal(frame['sum'], expected_frame['sum'])
+    np.testing.assert_allclose(frame['%'], expected_frame['%'])
+
+
+def test_single_rounds_match_legacy(rounds: List[pd.DataFrame]) -> None:
+    for df in rounds:
+        new, old = df.copy(), df.copy()
+        add_derivates_to_round(new)
+        legacy_add_derivates(old)
+
+        round_number = df.at[0, 'round']
+        np.testing.assert_array_equal(new['place'], old['place'], err_msg=f"round {round_number}")
+        np.testing.assert_array_equal(new['sum'], old['sum'], err_msg=f"round {round_number}")
+        np.testing.assert_allclose(new['%'], old['%'], err_msg=f"round {round_number}")
@@ -0,0 +1,54 @@
+""" Tests of the all-draws badge (find_all_draws).
+
+Up to badge rules version 1 the diagonal of the results table (a player against themselves,
+always 0) was counted as a match that was not drawn, so the badge was never awarded. Since
+version 2 only the opponents count. Run from API/ with
+    python -m pytest test_badges.py
+"""
+import glob
+import os
+from typing import List
+
+import pandas as pd
+
+from analysis import add_derivates_to_round, read_round, round_number_from_file
+from badges import find_all_draws
+from history import history_from_rounds
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+RAW_FILES = sorted(glob.glob(os.path.join(API_DIR, 'data/raw/round_*.csv')),
+                   key=round_number_from_file)
+
+
+def make_round(round_number: int, players: List[str], results: List[List[int]]) -> pd.DataFrame:
+    """ Table of a single round as read from a raw file (without cards). """
+    df = pd.DataFrame({'player': players, 'card_1': 'Black Lotus'})
+    for i in range(len(players)):
+        df[f"result_{i}"] = [row[i] for row in results]
+    df['round'] = round_number
+
+    return df
+
+
+def test_all_draws_ignores_diagonal() -> None:
+    # A drew against both opponents, B won against C
+    history = history_from_rounds([make_round(40, ['A', 'B', 'C'],
+                                              [[0, 3, 2],
+                                               [3, 0, 6],
+                                               [2, 0, 0]])])
+    add_derivates_to_round(history)
+
+    records = find_all_draws(history)
+
+    assert records.to_dict('records') == [{'player': 'A', 'start': 40, 'end': 40}]
+
+
+def test_all_draws_in_raw_data() -> None:
+    round_dfs = [read_round(file) for file in RAW_FILES]
+    history = history_from_rounds([df for df in round_dfs if df is not None])
+    add_derivates_to_round(history)
+
+    records = find_all_draws(history).sort_values(['player', 'start'])
+
+    assert list(records.itertuples(index=False, name=None)) == [
+        ('hoempes', 105, 105), ('lollonator', 105, 105), ('lollonator', 117, 117)]
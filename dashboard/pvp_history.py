@@ -1,3 +1,4 @@
+import sys
 from typing import List, Tuple
 
 import pandas as pd
@@ -6,12 +7,16 @@ from natsort import natsorted, ns
 import numpy as np
 import streamlit as st
 
+sys.path.append('../API')
+from match_table import load_match_table
+
 
 st.title('PvP match history')
 
 @st.cache_data
 def load_data() -> Tuple[pd.DataFrame, List[str]]:
-    data = pd.read_csv('match_data.csv', sep=';')
+    # match table kept up to date by API/analysis.py
+    data = load_match_table('../API/data/match_data.npz')
     all_players = natsorted(data['player_1'].unique(), alg=ns.IGNORECASE)
 
     return data, all_players
@@ -33,11 +33,26 @@ const PlayerStats = () => {
         setRoundsWon(data.n_wins);
         setScoreAverage(data.score_average);
         setScoreTotal(data.score_total);
-        setEloList(data.elo_list);
         setElo(data.elo);
         setNemesis(data.nemesis[0]);
         setBadgesData(data.badges);
+
+        // Elo history of all players: one row per round, one column per player
+        const eloIndex = await import('./data/elo_index.json');
+        const { default: eloUrl } = await import('./data/elo.bin?url');
+        const response = await fetch(eloUrl);
+        const eloMatrix = new Float64Array(await response.arrayBuffer());
+        const column = eloIndex.players.indexOf(name);
+        const nPlayers = eloIndex.players.length;
+        if (column === -1) {
+          throw new Error(`No Elo history for player ${name}`);
+        }
+        if (eloMatrix.length !== eloIndex.rounds.length * nPlayers) {
+          throw new Error('Elo history does not match its index');
+        }
+        setEloList(eloIndex.rounds.map((_, row) => eloMatrix[row * nPlayers + column]));
       } catch (err) {
+        setEloList([]);
         console.error('Player data not found:', err);
       }
     };